@@ -3,51 +3,69 @@
 """
 LogiDesk Win v1.2 - Import Wizard + UI más intuitiva
 """
-import os, sys, glob, json, datetime as dt, tkinter as tk
+import os, sys, traceback, multiprocessing, sqlite3, datetime as dt, tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-
-APP_NAME = "LogiDesk Win"
-BASE_DIR = os.path.abspath(".")
-HISTORY_DIR = os.path.join(BASE_DIR, "history")
-REPORT_DIR  = os.path.join(BASE_DIR, "reports")
-SESSION     = os.path.join(BASE_DIR, "current_session.csv")
-PROFILES    = os.path.join(BASE_DIR, "import_profiles.json")
-
-REQUIRED_COLS = [
-    "TRANSPORTISTA","MATRICULA","MUELLE","ESTADO","DESTINO",
-    "LLEGADA","LLEGADA REAL","SALIDA REAL","SALIDA TOPE","OBSERVACIONES","INCIDENCIAS"
-]
-
-ALIASES = {
-    "TRANSPORTISTA": ["TRANSPORTISTA"],
-    "MATRICULA": ["MATRICULA","MATRÍCULA","MAT."],
-    "MUELLE": ["MUELLE","DOCK","RAMPA"],
-    "ESTADO": ["ESTADO","STATUS"],
-    "DESTINO": ["DESTINO","DEST."],
-    "LLEGADA": ["LLEGADA","HORA LLEGADA","ETA"],
-    "LLEGADA REAL": ["LLEGADA REAL","LLEGADA_REAL","CHECK-IN","ENTRADA REAL"],
-    "SALIDA REAL": ["SALIDA REAL","SALIDA_REAL","CHECK-OUT"],
-    "SALIDA TOPE": ["SALIDA TOPE","SALIDA_TOPE","CUT-OFF","HORA TOPE"],
-    "OBSERVACIONES": ["OBSERVACIONES","OBS.","NOTAS"],
-    "INCIDENCIAS": ["INCIDENCIAS","INC.","EVENTOS"],
-}
-
-def load_profiles():
-    if os.path.exists(PROFILES):
+from logidesk_core import (
+    APP_NAME, HISTORY_DIR, REPORT_DIR, SESSION, HISTORY_RETENTION_DAYS, REQUIRED_COLS, DT_COLS, SNIFF_ROWS, REPORT_FORMATS,
+    TimeAnchors, FilterIndex, HistoryStore, SessionJournal, KpiCounters, Job, JobCancelled,
+    cached_read, file_key, list_sheets, load_import_table, read_sample, sniff_header_row, header_names, auto_map,
+    map_columns, normalize_anchored, parse_dt_times, session_frame, typed_value, display_value, display_frame, set_cells, profile_key, load_profiles, save_profiles, write_daily_report, range_report,
+)
+
+JOURNAL_COMPACT_MS = 2 * 60 * 1000  # cada cuánto se compacta el diario en el snapshot (si hay cambios)
+VT_BUFFER   = 10  # filas extra renderizadas por debajo de la zona visible
+FILTER_DEBOUNCE_MS = 250
+
+# ejecuta trabajos pesados en hilos; los callbacks (on_done/on_error/on_cancel) vuelven al hilo de Tk
+# mediante after(), porque Tk no se puede tocar desde otros hilos
+class JobRunner:
+    POLL_MS = 100
+
+    def __init__(self, root, on_change=None, workers=2):
+        self.root = root; self.on_change = on_change; self.running = []; self._polling = False
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="logidesk-job")
+
+    def submit(self, label, fn, *args, on_done=None, on_error=None, on_cancel=None, cancellable=True):
+        # cancellable=False: escrituras que no atienden al Job (sesión, histórico); "Cancelar" no las toca
+        job = Job(label, cancellable)
+        self.running.append((job, self.pool.submit(fn, job, *args), on_done, on_error, on_cancel))
+        if not self._polling: self._polling = True; self.root.after(self.POLL_MS, self._poll)
+        self._changed()
+        return job
+
+    def _poll(self):
+        # una sola pasada: un trabajo que termina durante el reparto no se pierde entre las dos listas
+        done = [r[1].done() for r in self.running]
+        finished = [r for r, d in zip(self.running, done) if d]
+        self.running = [r for r, d in zip(self.running, done) if not d]
         try:
-            with open(PROFILES, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
-
-def save_profiles(p):
-    try:
-        with open(PROFILES, "w", encoding="utf-8") as f:
-            json.dump(p, f, indent=2, ensure_ascii=False)
-    except Exception:
-        pass
+            for job, fut, on_done, on_error, on_cancel in finished:
+                try:
+                    exc = fut.exception()
+                    if job.cancelled or isinstance(exc, JobCancelled):
+                        if on_cancel: on_cancel()
+                    elif exc is not None:
+                        if on_error: on_error(exc)
+                    elif on_done: on_done(fut.result())
+                except Exception:
+                    # un callback que falla no impide entregar el resto ni seguir sondeando
+                    traceback.print_exc()
+        finally:
+            self._changed()
+            if self.running: self.root.after(self.POLL_MS, self._poll)
+            else: self._polling = False
+
+    def _changed(self):
+        if self.on_change: self.on_change(self.running[-1][0] if self.running else None)
+
+    def cancel_all(self):
+        for job, *_ in self.running:
+            if job.cancellable: job.cancel()
+
+    def shutdown(self):
+        self.cancel_all(); self.pool.shutdown(wait=False, cancel_futures=True)
 
 class ImportWizard(tk.Toplevel):
     def __init__(self, master, path):
@@ -56,8 +74,10 @@ class ImportWizard(tk.Toplevel):
         self.geometry("700x520")
         self.resizable(False, False)
         self.path = path
-        self.result_df = None
+        self.result_df = None; self.result_index = None; self.result_anchors = None
         self.profiles = load_profiles()
+        self._profile_key = None
+        self._job = None
 
         frame = ttk.Frame(self, padding=10)
         frame.pack(fill="both", expand=True)
@@ -67,8 +87,7 @@ class ImportWizard(tk.Toplevel):
         ext = os.path.splitext(path)[1].lower()
         if ext in [".xlsx",".xls"]:
             try:
-                xl = pd.ExcelFile(path)
-                sheets = xl.sheet_names
+                sheets = list_sheets(path)
             except Exception as e:
                 messagebox.showerror(APP_NAME, f"No se pudo leer el Excel: {e}")
         ttk.Label(frame, text="1) Hoja:").grid(row=0, column=0, sticky="w")
@@ -76,6 +95,7 @@ class ImportWizard(tk.Toplevel):
         self.cmb_sheet.grid(row=0, column=1, sticky="w")
         if sheets:
             self.cmb_sheet.current(0)
+        self.cmb_sheet.bind("<<ComboboxSelected>>", lambda e: self.auto_detect())
 
         ttk.Label(frame, text="2) Fila de encabezados (1,2,3…):").grid(row=1, column=0, sticky="w", pady=(10,0))
         self.ent_header = ttk.Entry(frame, width=10); self.ent_header.insert(0, "1"); self.ent_header.grid(row=1, column=1, sticky="w", pady=(10,0))
@@ -90,82 +110,119 @@ class ImportWizard(tk.Toplevel):
         self.map_frame = ttk.Frame(frame); self.map_frame.grid(row=6, column=0, columnspan=2, sticky="w")
 
         btns = ttk.Frame(frame); btns.grid(row=7, column=0, columnspan=2, pady=12, sticky="e")
-        ttk.Button(btns, text="Cancelar", command=self.destroy).pack(side="right", padx=6)
-        ttk.Button(btns, text="Importar", command=self.finish).pack(side="right")
+        ttk.Button(btns, text="Cancelar", command=self.cancel).pack(side="right", padx=6)
+        self.btn_import = ttk.Button(btns, text="Importar", command=self.finish); self.btn_import.pack(side="right")
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
 
         helpbox = ttk.LabelFrame(self, text="Ayuda", padding=10)
         helpbox.pack(fill="x", padx=10, pady=(0,10))
         ttk.Label(helpbox, text=(
-            "• Si tu Excel tiene títulos en la fila 2 o 3, pon ese número en 'Fila de encabezados'.\n"
+            "• La fila de encabezados se detecta sola; si tu Excel tiene títulos en otra fila, corrige el número.\n"
             "• 'Fila donde empiezan los datos' es la primera fila REAL con registros.\n"
             "• Las columnas 'Unnamed' o vacías se descartan automáticamente.\n"
             "• Asigna las columnas del archivo a TRANSPORTISTA, MATRICULA, etc.\n"
             "• El mapeo se guarda y se reutilizará la próxima vez para ese archivo/hoja."
         )).pack(anchor="w")
+        self.auto_detect()
+
+    def _read_args(self):
+        sheet = self.var_sheet.get() if self.var_sheet.get() else 0
+        return sheet, int(self.ent_header.get()), int(self.ent_start.get())
 
     def _read_df(self):
+        # previsualizar e importar comparten la misma lectura (no se modifica: finish construye un DataFrame nuevo)
+        return load_import_table(self.path, *self._read_args())
+
+    def _sample(self):
+        sheet = self.var_sheet.get() if self.var_sheet.get() else 0
+        return cached_read(("sample",) + file_key(self.path) + (sheet, SNIFF_ROWS), lambda: read_sample(self.path, sheet))
+
+    def auto_detect(self):
+        # al abrir o cambiar de hoja: detectar fila de encabezados con una muestra y previsualizar
+        try:
+            sample = self._sample()
+        except Exception as e:
+            messagebox.showerror(APP_NAME, f"No se pudo previsualizar: {e}")
+            return
+        header = sniff_header_row(sample)
+        self.ent_header.delete(0, tk.END); self.ent_header.insert(0, str(header))
+        self.ent_start.delete(0, tk.END); self.ent_start.insert(0, str(header + 1))
+        self.preview()
+        profile = self.profiles.get(self._profile_key)
+        if profile and profile.get("start"):
+            self.ent_start.delete(0, tk.END); self.ent_start.insert(0, str(profile["start"]))
+
+    def _columns(self):
         header_visible = int(self.ent_header.get())
-        start_visible  = int(self.ent_start.get())
-        header_idx = max(header_visible - 1, 0)
-        skiprows = list(range(0, start_visible - 1)) if start_visible - 1 > 0 else None
-        ext = os.path.splitext(self.path)[1].lower()
-        if ext == ".csv":
-            df = pd.read_csv(self.path, sep=None, engine="python", header=header_idx, skiprows=skiprows)
-        else:
-            sheet = self.var_sheet.get() if self.var_sheet.get() else 0
-            df = pd.read_excel(self.path, sheet_name=sheet, header=header_idx, skiprows=skiprows)
-        # limpiar columnas unnamed
-        new_cols = []
-        for c in df.columns:
-            name = str(c).strip()
-            if name.startswith("Unnamed"):
-                name = ""
-            new_cols.append(name)
-        df.columns = new_cols
-        df = df.loc[:, [c for c in df.columns if str(c).strip() != ""]]
-        df = df.dropna(how="all")
-        return df
+        sample = self._sample()
+        if header_visible <= len(sample): return header_names(sample, header_visible)
+        return [str(c) for c in self._read_df().columns]
 
     def preview(self):
         try:
-            df = self._read_df()
+            cols = self._columns()
         except Exception as e:
             messagebox.showerror(APP_NAME, f"No se pudo previsualizar: {e}")
             return
         self.list_cols.delete(0, tk.END)
-        for c in df.columns:
-            self.list_cols.insert(tk.END, str(c))
+        for c in cols:
+            self.list_cols.insert(tk.END, c)
         for child in self.map_frame.winfo_children():
             child.destroy()
-        cols = [str(c) for c in df.columns]
+        self._profile_key = profile_key(self.var_sheet.get(), cols)
+        # perfil guardado para esta firma de columnas; si no, autoselección por ALIASES
+        profile = self.profiles.get(self._profile_key)
+        mapping = {k: v for k, v in profile.get("mapping", {}).items() if v in cols} if profile else auto_map(cols)
         self.cmb_map = {}
         for i, std in enumerate(REQUIRED_COLS):
             ttk.Label(self.map_frame, text=std, width=16).grid(row=i, column=0, sticky="w")
             cmb = ttk.Combobox(self.map_frame, values=["--No importar--"] + cols, width=40, state="readonly")
-            # autoselección simple por nombre exacto
-            chosen = None
-            for c in cols:
-                if c.strip().upper() == std:
-                    chosen = c; break
+            chosen = mapping.get(std)
             cmb.set(chosen if chosen else "--No importar--")
             cmb.grid(row=i, column=1, sticky="w")
             self.cmb_map[std] = cmb
 
+    def cancel(self):
+        if self._job is not None: self._job.cancel()
+        self.destroy()
+
     def finish(self):
-        try:
-            df = self._read_df()
-        except Exception as e:
-            messagebox.showerror(APP_NAME, f"No se pudo leer el archivo: {e}")
-            return
-        out = {c: [] for c in REQUIRED_COLS}
-        n = len(df)
-        for std in REQUIRED_COLS:
-            src = self.cmb_map[std].get()
-            if src and src != "--No importar--" and src in df.columns:
-                out[std] = df[src].astype(str).fillna("")
-            else:
-                out[std] = pd.Series([""]*n)
-        self.result_df = pd.DataFrame(out)
+        # lectura completa, mapeo y tipado van en segundo plano; la ventana principal sigue respondiendo
+        if self._job is not None: return
+        try: args = self._read_args()
+        except ValueError: messagebox.showerror(APP_NAME, "Las filas de encabezado y de datos deben ser números."); return
+        mapping = {std: cmb.get() for std, cmb in self.cmb_map.items() if cmb.get() != "--No importar--"}
+        op_date = self.master.anchors.op_date
+        self.btn_import.state(["disabled"])
+        self._job = self.master.jobs.submit(f"Importando {os.path.basename(self.path)}…", self._load, args, mapping, op_date,
+                                            on_done=lambda r: self._finish_loaded(*r, args, mapping), on_error=self._finish_failed,
+                                            on_cancel=self._finish_cancelled)
+
+    def _load(self, job, args, mapping, op_date):
+        # hilo de trabajo (sin Tk): lectura, mapeo, tipado, horas sueltas y el índice de filtros
+        df, anchors = normalize_anchored(map_columns(load_import_table(self.path, *args, job), mapping), op_date); job.check()
+        return df, FilterIndex(df), anchors
+
+    def _finish_cancelled(self):
+        # "Cancelar" de la barra de estado: el asistente sigue abierto y se puede volver a importar
+        self._job = None
+        if self.winfo_exists(): self.btn_import.state(["!disabled"])
+
+    def _finish_failed(self, e):
+        self._job = None
+        if not self.winfo_exists(): return
+        self.btn_import.state(["!disabled"])
+        messagebox.showerror(APP_NAME, f"No se pudo leer el archivo: {e}")
+
+    def _finish_loaded(self, df, index, anchors, args, mapping):
+        self._job = None
+        if not self.winfo_exists(): return
+        self.result_df = df; self.result_index = index; self.result_anchors = anchors
+        self.profiles[self._profile_key] = {
+            "file": os.path.basename(self.path), "sheet": self.var_sheet.get(),
+            "header": args[1], "start": args[2], "mapping": mapping,
+        }
+        save_profiles(self.profiles)
         self.destroy()
 
 class LogiDeskApp(tk.Tk):
@@ -183,17 +240,28 @@ class LogiDeskApp(tk.Tk):
 
         self.df_orig = None
         self.df_view = None
+        self.anchors = TimeAnchors()
+        self.filter_index = None; self.filters = []; self._filter_job = None
+        self.kpis = None
 
         os.makedirs(HISTORY_DIR, exist_ok=True)
         os.makedirs(REPORT_DIR,  exist_ok=True)
+        self.history = HistoryStore()
+        try: self.history.import_legacy_csv()
+        except sqlite3.Error: pass
+        self.journal = SessionJournal(); self._compacting = None
+        self.jobs = JobRunner(self, on_change=self._show_job)
 
         self._build_menu()
         self._build_toolbar()
         self._build_filterbar()
+        self._build_kpis()
         self._build_table()
         self._build_help_status()
 
         self.protocol("WM_DELETE_WINDOW", self.on_exit)
+        self._restore_session()
+        self.after(JOURNAL_COMPACT_MS, self._autocompact)
 
     def _build_menu(self):
         m = tk.Menu(self)
@@ -203,6 +271,10 @@ class LogiDeskApp(tk.Tk):
         filem.add_command(label="Guardar sesión", command=self.save_session)
         filem.add_command(label="Cerrar día (a histórico)", command=self.close_day)
         filem.add_command(label="Exportar reporte del día (Excel)", command=self.export_daily_report)
+        filem.add_command(label="Exportar reporte del día (CSV)", command=lambda: self.export_daily_report("csv"))
+        filem.add_command(label="Exportar reporte del día (Parquet)", command=lambda: self.export_daily_report("parquet"))
+        filem.add_command(label="Reporte de rango (histórico)…", command=self.export_range_report)
+        filem.add_command(label="Fecha operativa…", command=self.set_op_date)
         m.add_cascade(label="Archivo", menu=filem)
         actm = tk.Menu(m, tearoff=0)
         actm.add_command(label="➕ LLEGADA REAL", command=self.mark_llegada_real)
@@ -226,15 +298,58 @@ class LogiDeskApp(tk.Tk):
         self.cmb_column = ttk.Combobox(filt, state="readonly", values=[]); self.cmb_column.pack(side="left", padx=4, ipadx=30)
         ttk.Label(filt, text="Valor contiene:").pack(side="left", padx=(12,4))
         self.ent_value = ttk.Entry(filt, width=30); self.ent_value.pack(side="left", padx=4)
+        self.ent_value.bind("<KeyRelease>", self._schedule_filter); self.ent_value.bind("<Return>", lambda e: self.apply_filter())
+        self.cmb_column.bind("<<ComboboxSelected>>", self._schedule_filter)
         ttk.Button(filt, text="Aplicar", command=self.apply_filter).pack(side="left", padx=6)
+        ttk.Button(filt, text="＋ Condición", command=self.add_filter_condition).pack(side="left", padx=6)
         ttk.Button(filt, text="Limpiar", command=self.clear_filter).pack(side="left", padx=6)
+        self.filters_text = tk.StringVar(value=""); ttk.Label(filt, textvariable=self.filters_text).pack(side="left", padx=(12,4))
+
+    def _build_kpis(self):
+        # panel de KPIs del día completo (no de la vista filtrada), actualizado en cada sellado/edición
+        box = ttk.LabelFrame(self, text="KPIs en vivo"); box.pack(fill="x", padx=10, pady=(0,6))
+        self.kpi_text = tk.StringVar(value="Sin datos."); ttk.Label(box, textvariable=self.kpi_text, justify="left").pack(side="left", anchor="n", padx=8, pady=4)
+        right = ttk.Frame(box); right.pack(side="right", fill="x", expand=True, padx=8, pady=4)
+        bar = ttk.Frame(right); bar.pack(fill="x")
+        ttk.Label(bar, text="Desglose por:").pack(side="left")
+        self.cmb_kpi_by = ttk.Combobox(bar, state="readonly", values=list(KpiCounters.BY), width=16); self.cmb_kpi_by.current(0); self.cmb_kpi_by.pack(side="left", padx=4)
+        self.cmb_kpi_by.bind("<<ComboboxSelected>>", lambda e: self._refresh_kpis())
+        self.kpi_tree = ttk.Treeview(right, show="headings", height=5); self.kpi_tree.pack(fill="x", pady=(4,0))
+
+    def _refresh_kpis(self):
+        self.kpi_tree.delete(*self.kpi_tree.get_children())
+        if self.kpis is None: self.kpi_text.set("Sin datos."); return
+        k = self.kpis.kpis()["Valor"]
+        pct = lambda v: f"{v:.1f} %" if v != "" else "—"
+        self.kpi_text.set(
+            f"Filas: {k['Total filas']}\n"
+            f"Con LLEGADA REAL: {pct(k['% con LLEGADA REAL'])}   Con SALIDA REAL: {pct(k['% con SALIDA REAL'])}\n"
+            f"Retrasos vs SALIDA TOPE: {k['Retrasos vs SALIDA TOPE (nº)']}   Puntualidad: {pct(k['Puntualidad vs SALIDA TOPE (%)'])}\n"
+            f"Estancia media: {k['Tiempo medio de estancia (hh:mm:ss)'] or '—'}")
+        t = self.kpis.breakdown(self.cmb_kpi_by.get())
+        cols = list(t.columns); self.kpi_tree["columns"] = cols
+        for c in cols: self.kpi_tree.heading(c, text=c); self.kpi_tree.column(c, width=140 if c in KpiCounters.BY else 110, anchor="w")
+        for row in t.itertuples(index=False, name=None): self.kpi_tree.insert("", "end", values=["" if pd.isna(v) else v for v in row])
 
     def _build_table(self):
         table = ttk.Frame(self); table.pack(fill="both", expand=True, padx=10, pady=(0,10))
         self.tree = ttk.Treeview(table, show="headings", selectmode="extended"); self.tree.pack(side="left", fill="both", expand=True)
         vsb = ttk.Scrollbar(table, orient="vertical", command=self.tree.yview); vsb.pack(side="right", fill="y")
         hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview); hsb.pack(fill="x", padx=10, pady=(0,10))
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.configure(xscrollcommand=hsb.set)
+        self.vsb = vsb; vsb.configure(command=self._vt_yview)
+        # tabla virtual: solo las filas visibles (+ margen) existen como items del Treeview
+        self._vt_df = None; self._vt_top = 0; self._vt_visible = 1; self._vt_iids = {}; self._vt_sel = set()
+        self.tree.bind("<Configure>", self._vt_on_configure)
+        self.tree.bind("<MouseWheel>", lambda e: self._vt_scroll(-1 * (e.delta // 120) * 3))
+        self.tree.bind("<Button-4>", lambda e: self._vt_scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self._vt_scroll(3))
+        self.tree.bind("<Up>", lambda e: self._vt_key(-1)); self.tree.bind("<Down>", lambda e: self._vt_key(1))
+        self.tree.bind("<Prior>", lambda e: self._vt_key(-self._vt_visible)); self.tree.bind("<Next>", lambda e: self._vt_key(self._vt_visible))
+        self.tree.bind("<Home>", lambda e: self._vt_key(-len(self._vt_df) if self._vt_df is not None else 0))
+        self.tree.bind("<End>", lambda e: self._vt_key(len(self._vt_df) if self._vt_df is not None else 0))
+        self.tree.bind("<Button-1>", self._vt_on_click, add="+")
+        self.tree.bind("<<TreeviewSelect>>", self._vt_on_select)
         self.tree.bind("<Double-1>", self._on_double_click_cell)
         import pandas as pd
         df = pd.DataFrame(columns=REQUIRED_COLS); self.df_orig=df.copy(); self.df_view=df.copy()
@@ -244,10 +359,27 @@ class LogiDeskApp(tk.Tk):
         helpf = ttk.LabelFrame(self, text="Ayuda rápida"); helpf.pack(fill="x", padx=10, pady=(0,8))
         ttk.Label(helpf, text=(
             "1) Cargar Excel/CSV (Asistente) → elige hoja, pon fila de títulos y de datos; mapea columnas.\n"
-            "2) Usa ➕ LLEGADA REAL / ➕ SALIDA REAL para sellar hora actual en las filas seleccionadas.\n"
+            "2) Usa ➕ LLEGADA REAL / ➕ SALIDA REAL para sellar hora actual en las filas seleccionadas (el panel KPIs en vivo se actualiza al momento).\n"
             "3) Cerrar día → guarda snapshot (30 días). Exportar Excel → KPIs y resúmenes."
         )).pack(anchor="w")
-        self.status = tk.StringVar(value="Listo."); ttk.Label(self, textvariable=self.status, relief="sunken", anchor="w").pack(fill="x")
+        statusf = ttk.Frame(self); statusf.pack(fill="x")
+        self.status = tk.StringVar(value="Listo."); ttk.Label(statusf, textvariable=self.status, relief="sunken", anchor="w").pack(side="left", fill="x", expand=True)
+        self.btn_cancel_job = ttk.Button(statusf, text="Cancelar", command=lambda: self.jobs.cancel_all())
+        self.progress = ttk.Progressbar(statusf, length=220, maximum=1.0)
+
+    def _show_job(self, job):
+        # barra de progreso del trabajo en curso (indeterminada si no informa fracción)
+        if job is None:
+            self.progress.stop(); self.progress.pack_forget(); self.btn_cancel_job.pack_forget(); return
+        if not self.progress.winfo_ismapped():
+            self.btn_cancel_job.pack(side="right", padx=4); self.progress.pack(side="right", padx=4)
+        self.btn_cancel_job.state(["!disabled"] if any(j.cancellable for j, *_ in self.jobs.running) else ["disabled"])
+        if job.fraction is None:
+            if str(self.progress["mode"]) != "indeterminate": self.progress.configure(mode="indeterminate"); self.progress.start(15)
+        else:
+            if str(self.progress["mode"]) != "determinate": self.progress.stop(); self.progress.configure(mode="determinate")
+            self.progress["value"] = job.fraction
+        self.status.set(job.label)
 
     # import
     def load_file(self):
@@ -255,13 +387,46 @@ class LogiDeskApp(tk.Tk):
         if not path: return
         wiz = ImportWizard(self, path); self.wait_window(wiz)
         if wiz.result_df is None: self.status.set("Importación cancelada."); return
-        df = wiz.result_df
+        # el índice (0..n-1) es el id de fila estable que usan los iids del Treeview, las ediciones y el diario
+        self._set_data(wiz.result_df, wiz.result_index, wiz.result_anchors)
+        self.status.set(f"Importado {os.path.basename(path)}")
+
+    def _set_data(self, df, filter_index=None, anchors=None, new=True):
+        # new=False: datos restaurados de la sesión (el snapshot y el diario actuales siguen valiendo)
+        self.df_orig = df; self.df_view = df; self.anchors = anchors or TimeAnchors(self.anchors.op_date)
+        self.filter_index = filter_index or FilterIndex(df); self.filters = []; self.filters_text.set("")
+        self.kpis = KpiCounters(df); self._refresh_kpis()
+        self._refresh_columns_combobox(); self._populate_table(self.df_view)
+        if new: self.journal.reset()
+        self._compact_async()
+
+    def _compact_async(self, on_done=None):
+        # copia y rotación del diario en el hilo de Tk (mismo instante); el CSV con fsync, en segundo plano
+        if self.df_orig is None: return
+        df = self.df_orig.copy(); rows = self.anchors.rows(); day = self.anchors.day.date(); seq, n = self.journal.rotate()
+        def failed(e):
+            self.journal.pending += n; self.status.set(f"No se pudo guardar la sesión: {e}")
+            if on_done: messagebox.showerror(APP_NAME, f"No se pudo guardar la sesión.\n\n{e}")
+        self._compacting = self.jobs.submit("Guardando sesión…", lambda job: self.journal.write_snapshot(session_frame(df, rows), seq, day),
+                                            on_done=lambda _: on_done and on_done(), on_error=failed, cancellable=False)
+
+    def _restore_session(self):
+        try: df = self.journal.restore()
+        except Exception as e: messagebox.showerror(APP_NAME, f"No se pudo restaurar la sesión anterior.\n\n{e}"); return
+        if df is None or df.empty: return
         for col in REQUIRED_COLS:
             if col not in df.columns: df[col] = ""
-        df = df[REQUIRED_COLS]
-        self.df_orig = df.copy(); self.df_view = df.copy()
-        self._refresh_columns_combobox(); self._populate_table(self.df_view)
-        self.status.set(f"Importado {os.path.basename(path)}")
+        replayed = self.journal.pending
+        # las horas sueltas vuelven a la fecha a la que estaban ancladas, no a la de hoy
+        df, anchors = normalize_anchored(df[REQUIRED_COLS], self.journal.op_date or self.anchors.op_date)
+        self._set_data(df, anchors=anchors, new=False)
+        self.status.set(f"Sesión restaurada ({len(df)} filas, {replayed} cambio(s) recuperados del diario).")
+
+    def _autocompact(self):
+        # una compactación cada vez; si la anterior sigue escribiendo, se espera al siguiente turno
+        busy = self._compacting is not None and any(job is self._compacting for job, *_ in self.jobs.running)
+        if self.journal.pending and not busy: self._compact_async()
+        self.after(JOURNAL_COMPACT_MS, self._autocompact)
 
     def _refresh_columns_combobox(self):
         if self.df_view is not None:
@@ -274,112 +439,221 @@ class LogiDeskApp(tk.Tk):
         cols = list(df.columns); self.tree["columns"] = cols
         for c in cols:
             self.tree.heading(c, text=c); self.tree.column(c, width=150 if c in REQUIRED_COLS else 120, stretch=True, anchor="w")
-        for i, row in df.iterrows():
-            self.tree.insert("", "end", iid=str(i), values=[row[c] for c in cols])
-
-    def _sync_view_from_tree(self):
-        if self.df_view is None: return
-        cols = list(self.df_view.columns); new_rows = []
-        for iid in self.tree.get_children(): new_rows.append(self.tree.item(iid, "values"))
-        import pandas as pd
-        self.df_view = pd.DataFrame(new_rows, columns=cols)
+        self._vt_df = df; self._vt_top = 0; self._vt_sel = set()
+        self._vt_refill()
+
+    # tabla virtual
+    def _vt_rowheight(self):
+        try: return int(ttk.Style(self).lookup("Treeview", "rowheight") or 20)
+        except (tk.TclError, ValueError): return 20
+
+    def _vt_on_configure(self, event=None):
+        visible = max(1, self.tree.winfo_height() // self._vt_rowheight() - 1)
+        if visible != self._vt_visible: self._vt_visible = visible; self._vt_refill()
+
+    def _vt_refill(self):
+        df = self._vt_df
+        self.tree.delete(*self.tree.get_children()); self._vt_iids = {}
+        if df is None or df.empty: self.vsb.set(0.0, 1.0); return
+        total = len(df)
+        self._vt_top = max(0, min(self._vt_top, total - self._vt_visible))
+        chunk = display_frame(df.iloc[self._vt_top:self._vt_top + self._vt_visible + VT_BUFFER])
+        for label, values in zip(chunk.index, chunk.itertuples(index=False, name=None)):
+            iid = str(label); self._vt_iids[iid] = label
+            self.tree.insert("", "end", iid=iid, values=values)
+        keep = [str(l) for l in chunk.index if l in self._vt_sel]
+        if keep: self.tree.selection_set(keep)
+        self.tree.yview_moveto(0)
+        self.vsb.set(self._vt_top / total, min(1.0, (self._vt_top + self._vt_visible) / total))
+
+    def _vt_scroll(self, rows):
+        if self._vt_df is None: return "break"
+        top = max(0, min(self._vt_top + int(rows), len(self._vt_df) - self._vt_visible))
+        if top != self._vt_top: self._vt_top = top; self._vt_refill()
+        return "break"
+
+    def _vt_yview(self, *args):
+        if self._vt_df is None or not args: return
+        if args[0] == "moveto": self._vt_scroll(int(float(args[1]) * len(self._vt_df)) - self._vt_top)
+        elif args[0] == "scroll":
+            step = int(args[1]); self._vt_scroll(step * self._vt_visible if args[2] == "pages" else step)
+
+    def _vt_key(self, step):
+        df = self._vt_df
+        if df is None or df.empty: return "break"
+        focus = self.tree.focus()
+        pos = self._vt_top + self.tree.index(focus) if focus in self._vt_iids else self._vt_top
+        pos = max(0, min(pos + step, len(df) - 1))
+        if pos < self._vt_top: self._vt_top = pos
+        elif pos >= self._vt_top + self._vt_visible: self._vt_top = pos - self._vt_visible + 1
+        self._vt_sel = {df.index[pos]}; self._vt_refill()
+        iid = str(df.index[pos]); self.tree.focus(iid); self.tree.selection_set(iid)
+        return "break"
+
+    def _vt_on_click(self, event):
+        # clic sin Ctrl/Shift: la selección fuera de pantalla también se descarta
+        if not event.state & 0x0005: self._vt_sel = set()
+
+    def _vt_on_select(self, event=None):
+        shown = set(self._vt_iids.values())
+        self._vt_sel = {l for l in self._vt_sel if l not in shown} | {self._vt_iids[i] for i in self.tree.selection() if i in self._vt_iids}
+
+    def _selected_labels(self):
+        if self._vt_df is None: return []
+        return sorted(self._vt_sel, key=self._vt_df.index.get_loc)
+
+    # edición por id de fila: solo se tocan las celdas afectadas, en df_orig y en la vista filtrada
+    def _apply_edit(self, labels, col, value, time_only=False):
+        # value ya viene tipado (Timestamp en columnas de fecha); el texto solo se usa para diario, índice y pantalla.
+        # time_only: se escribió solo la hora (queda anclada a la fecha operativa y el diario guarda la hora)
+        labels = list(labels)
+        if not labels: return
+        text = display_value(value)
+        self.journal.append(labels, col, value.strftime("%H:%M:%S") if time_only else text)
+        set_cells(self.df_orig, labels, col, value)
+        if col in DT_COLS: self.anchors.update(col, labels, time_only)
+        if self.filter_index is not None: self.filter_index.update(labels, col, text)
+        if self.kpis is not None and self.kpis.update(self.df_orig, labels, col): self._refresh_kpis()
+        if self.df_view is not self.df_orig:
+            in_view = [l for l in labels if l in self.df_view.index]
+            if in_view: set_cells(self.df_view, in_view, col, value)
+        idx = list(self.tree["columns"]).index(col)
+        for l in labels:
+            iid = str(l)
+            if iid in self._vt_iids: vals = list(self.tree.item(iid, "values")); vals[idx] = text; self.tree.item(iid, values=vals)
 
     def _on_double_click_cell(self, event): self.edit_selected_cell()
     def edit_selected_cell(self):
-        sel = self.tree.selection()
+        sel = self._selected_labels()
         if not sel: messagebox.showinfo(APP_NAME, "Seleccione una fila para editar."); return
-        iid = sel[0]; col_ids = self.tree["columns"]
+        iid = str(sel[0]); col_ids = self.tree["columns"]
+        if iid not in self._vt_iids:
+            self._vt_top = self._vt_df.index.get_loc(sel[0]); self._vt_refill()
         col = simpledialog.askstring(APP_NAME, "¿Qué columna desea editar? (nombre exacto)")
         if not col or col not in col_ids: return
         idx = list(col_ids).index(col); cur = self.tree.item(iid, "values")[idx]
         new = simpledialog.askstring(APP_NAME, f"Nuevo valor para '{col}':", initialvalue=cur)
         if new is None: return
-        vals = list(self.tree.item(iid, "values")); vals[idx] = new; self.tree.item(iid, values=vals); self._sync_view_from_tree()
+        try: value = typed_value(col, new, self.anchors.day)
+        except ValueError as e: messagebox.showwarning(APP_NAME, str(e)); return
+        self._apply_edit([sel[0]], col, value, col in DT_COLS and bool(parse_dt_times(pd.Series([new]))[1][0]))
+
+    def _schedule_filter(self, event=None):
+        # filtrado en vivo al teclear, con debounce
+        if self._filter_job is not None: self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DEBOUNCE_MS, self.apply_filter)
+
+    def _current_conditions(self):
+        column = self.cmb_column.get().strip(); needle = self.ent_value.get().strip()
+        return self.filters + ([(column, needle)] if column and needle else [])
 
     def apply_filter(self):
+        self._filter_job = None
         if self.df_orig is None: return
+        conds = self._current_conditions()
+        if any(c not in self.df_orig.columns for c, _ in conds): messagebox.showwarning(APP_NAME, "La columna indicada no existe en los datos."); return
+        if self.filter_index is None: self.filter_index = FilterIndex(self.df_orig)
+        pos = self.filter_index.query(conds)
+        self.df_view = self.df_orig if pos is None else self.df_orig.iloc[pos]
+        self._populate_table(self.df_view)
+        desc = " y ".join(f"{c} contiene '{v}'" for c, v in conds) or "ninguno"
+        self.status.set(f"Filtro aplicado: {desc} ({len(self.df_view)} fila(s))")
+
+    def add_filter_condition(self):
         column = self.cmb_column.get().strip(); needle = self.ent_value.get().strip()
-        df = self.df_orig.copy()
-        if column and needle:
-            if column not in df.columns: messagebox.showwarning(APP_NAME, "La columna indicada no existe en los datos."); return
-            df = df[df[column].astype(str).str.contains(needle, case=False, na=False)]
-        self.df_view = df; self._populate_table(df); self.status.set(f"Filtro aplicado: {column} contiene '{needle}'")
+        if not column or not needle: return
+        self.filters.append((column, needle)); self.ent_value.delete(0, tk.END)
+        self.filters_text.set(" Y ".join(f"{c} ∋ '{v}'" for c, v in self.filters)); self.apply_filter()
 
     def clear_filter(self):
         if self.df_orig is None: return
-        self.ent_value.delete(0, tk.END); self.df_view = self.df_orig.copy(); self._populate_table(self.df_view); self.status.set("Filtros limpiados.")
+        if self._filter_job is not None: self.after_cancel(self._filter_job); self._filter_job = None
+        self.filters = []; self.filters_text.set("")
+        self.ent_value.delete(0, tk.END); self.df_view = self.df_orig; self._populate_table(self.df_view); self.status.set("Filtros limpiados.")
 
     def _set_timestamp_for_selected(self, target):
         if self.df_view is None: return
-        sels = self.tree.selection()
+        sels = self._selected_labels()
         if not sels: messagebox.showinfo(APP_NAME, "Seleccione al menos una fila."); return
-        now = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        try: idx = list(self.tree["columns"]).index(target)
-        except ValueError: messagebox.showwarning(APP_NAME, f"No existe la columna '{target}'."); return
-        for iid in sels:
-            vals = list(self.tree.item(iid, "values")); vals[idx] = now; self.tree.item(iid, values=vals)
-        self._sync_view_from_tree(); self.status.set(f"{target} sellada para {len(sels)} fila(s).")
+        now = pd.Timestamp.now().floor("s")
+        if target not in self.df_orig.columns: messagebox.showwarning(APP_NAME, f"No existe la columna '{target}'."); return
+        self._apply_edit(sels, target, now); self.status.set(f"{target} sellada para {len(sels)} fila(s).")
     def mark_llegada_real(self): self._set_timestamp_for_selected("LLEGADA REAL")
     def mark_salida_real(self): self._set_timestamp_for_selected("SALIDA REAL")
 
-    def export_daily_report(self):
+    def export_daily_report(self, fmt="xlsx"):
         if self.df_view is None or self.df_view.empty: messagebox.showwarning(APP_NAME, "No hay datos para reportar."); return
-        import pandas as pd
-        def parse_dt(s):
-            if pd.isna(s) or str(s).strip() == "": return pd.NaT
-            for fmt in ("%Y-%m-%d %H:%M:%S","%d/%m/%Y %H:%M","%d/%m/%Y %H:%M:%S","%H:%M","%H:%M:%S"):
-                try:
-                    if fmt in ("%H:%M","%H:%M:%S"):
-                        t = pd.to_datetime(str(s), format=fmt, errors="coerce")
-                        if pd.isna(t): continue
-                        today = pd.Timestamp.today().normalize()
-                        return today + pd.to_timedelta(t.strftime("%H:%M:%S"))
-                    return pd.to_datetime(str(s), format=fmt, errors="coerce")
-                except Exception: continue
-            return pd.to_datetime(str(s), errors="coerce", dayfirst=True)
-        tmp = self.df_view.copy()
-        tmp["LR_dt"] = tmp["LLEGADA REAL"].apply(parse_dt)
-        tmp["SR_dt"] = tmp["SALIDA REAL"].apply(parse_dt)
-        tmp["ST_dt"] = tmp["SALIDA TOPE"].apply(parse_dt)
-        total = len(tmp); con_lr = tmp["LR_dt"].notna().sum(); con_sr = tmp["SR_dt"].notna().sum()
-        retrasos = ((tmp["SR_dt"].notna()) & (tmp["ST_dt"].notna()) & (tmp["SR_dt"] > tmp["ST_dt"])).sum()
-        estancias = (tmp["SR_dt"] - tmp["LR_dt"]).dropna(); media = str(estancias.mean()) if not estancias.empty else ""
-        kpis = {"Total filas": total, "% con LLEGADA REAL": (con_lr/total*100) if total else 0.0, "% con SALIDA REAL": (con_sr/total*100) if total else 0.0, "Retrasos vs SALIDA TOPE (nº)": int(retrasos), "Tiempo medio de estancia (hh:mm:ss)": media}
-        ts = dt.datetime.now().strftime("%Y-%m-%d_%H%M%S"); out_path = os.path.join(REPORT_DIR, f"{ts}_report.xlsx")
-        try:
-            with pd.ExcelWriter(out_path, engine="openpyxl") as w:
-                pd.DataFrame([kpis]).T.rename(columns={0:"Valor"}).to_excel(w, index=True, header=True, sheet_name="KPIs")
-                self.df_view.to_excel(w, index=False, sheet_name="Datos del día")
-                tmp.groupby("TRANSPORTISTA", dropna=False).agg(total=("TRANSPORTISTA","size"),
-                    con_llegada_real=("LR_dt", lambda s: s.notna().sum()),
-                    con_salida_real=("SR_dt", lambda s: s.notna().sum())).reset_index().to_excel(w, index=False, sheet_name="Por transportista")
-                tmp.groupby("MUELLE", dropna=False).agg(total=("MUELLE","size"),
-                    con_llegada_real=("LR_dt", lambda s: s.notna().sum()),
-                    con_salida_real=("SR_dt", lambda s: s.notna().sum())).reset_index().to_excel(w, index=False, sheet_name="Por muelle")
-                tmp.loc[tmp["INCIDENCIAS"].astype(str).str.strip() != "", ["TRANSPORTISTA","MATRICULA","MUELLE","ESTADO","DESTINO","INCIDENCIAS"]].to_excel(w, index=False, sheet_name="Incidencias")
-            messagebox.showinfo(APP_NAME, f"Reporte creado:\n{out_path}")
-        except Exception as e:
-            messagebox.showerror(APP_NAME, f"No se pudo crear el reporte.\n\n{e}")
+        # la escritura del Excel va en segundo plano sobre una copia (las columnas de fecha ya son datetime64)
+        view = self.df_view.copy()
+        parsed = [view[c] for c in ("LLEGADA REAL","SALIDA REAL","SALIDA TOPE")]
+        if fmt == "parquet":
+            try: pd.io.parquet.get_engine("auto")
+            except ImportError: messagebox.showwarning(APP_NAME, "Para exportar en Parquet hace falta instalar pyarrow."); return
+        ts = dt.datetime.now().strftime("%Y-%m-%d_%H%M%S"); out_path = os.path.join(REPORT_DIR, f"{ts}_report{REPORT_FORMATS[fmt]}")
+        self.jobs.submit("Generando reporte…", write_daily_report, view, *parsed, out_path, fmt,
+                         on_done=self._report_done, on_error=self._report_failed, on_cancel=lambda: self.status.set("Reporte cancelado."))
+
+    def _report_done(self, out_path):
+        if out_path is None: messagebox.showwarning(APP_NAME, "No hay cierres de día en ese rango."); return
+        self.status.set(f"Reporte creado: {os.path.basename(out_path)}"); messagebox.showinfo(APP_NAME, f"Reporte creado:\n{out_path}")
+
+    def _report_failed(self, e):
+        self.status.set("Error al crear el reporte."); messagebox.showerror(APP_NAME, f"No se pudo crear el reporte.\n\n{e}")
+
+    def set_op_date(self):
+        cur = self.anchors.day.date()
+        val = simpledialog.askstring(APP_NAME, "Fecha operativa para horas sin fecha (AAAA-MM-DD):", initialvalue=str(cur))
+        if val is None: return
+        try: op_date = dt.date.fromisoformat(val.strip())
+        except ValueError: messagebox.showwarning(APP_NAME, "Fecha no válida. Use el formato AAAA-MM-DD."); return
+        if self.df_orig is None: self.anchors = TimeAnchors(op_date)
+        else: self._reanchor(op_date)
+        self.status.set(f"Fecha operativa: {op_date}")
+
+    def _reanchor(self, op_date):
+        # las horas sueltas importadas o editadas pasan al día nuevo: datos, índice de filtros, KPIs y vista
+        moved = self.anchors.set_op_date(self.df_orig, op_date); self.journal.append_op_date(self.anchors.day.date())
+        for col, labels in moved.items():
+            if self.filter_index is not None: self.filter_index.update_values(labels, col, self.df_orig.loc[labels, col])
+            if self.kpis is not None: self.kpis.update(self.df_orig, labels, col)
+        if moved: self._refresh_kpis(); self.apply_filter()
+
+    def export_range_report(self):
+        today = dt.date.today()
+        start = simpledialog.askstring(APP_NAME, "Desde (AAAA-MM-DD):", initialvalue=str(today - dt.timedelta(days=6)))
+        if start is None: return
+        end = simpledialog.askstring(APP_NAME, "Hasta (AAAA-MM-DD):", initialvalue=str(today))
+        if end is None: return
+        try: start, end = dt.date.fromisoformat(start.strip()), dt.date.fromisoformat(end.strip())
+        except ValueError: messagebox.showwarning(APP_NAME, "Fecha no válida. Use el formato AAAA-MM-DD."); return
+        out_path = os.path.join(REPORT_DIR, f"{start}_{end}_range_report.xlsx")
+        self.jobs.submit("Generando reporte de rango…", lambda job: range_report(self.history, start, end, out_path, job=job),
+                         on_done=self._report_done, on_error=self._report_failed, on_cancel=lambda: self.status.set("Reporte cancelado."))
 
     def save_session(self):
-        if self.df_view is None: messagebox.showwarning(APP_NAME, "No hay datos para guardar."); return
-        try: self.df_view.to_csv(SESSION, index=False, encoding="utf-8"); messagebox.showinfo(APP_NAME, f"Sesión guardada en {SESSION}")
-        except Exception as e: messagebox.showerror(APP_NAME, f"No se pudo guardar la sesión.\n\n{e}")
+        if self.df_orig is None: messagebox.showwarning(APP_NAME, "No hay datos para guardar."); return
+        self._compact_async(on_done=lambda: messagebox.showinfo(APP_NAME, f"Sesión guardada en {SESSION}"))
 
     def close_day(self):
-        if self.df_view is None or self.df_view.empty: messagebox.showwarning(APP_NAME, "No hay datos a guardar en el histórico."); return
-        today = dt.datetime.now().strftime("%Y-%m-%d"); ts = dt.datetime.now().strftime("%H%M%S"); os.makedirs(HISTORY_DIR, exist_ok=True); fname = os.path.join(HISTORY_DIR, f"{today}_{ts}.csv")
-        try: self.df_view.to_csv(fname, index=False, encoding="utf-8"); messagebox.showinfo(APP_NAME, f"Histórico guardado: {fname}")
-        except Exception as e: messagebox.showerror(APP_NAME, f"No se pudo guardar el histórico.\n\n{e}")
+        # se guarda el día completo (df_orig), no solo la vista filtrada
+        if self.df_orig is None or self.df_orig.empty: messagebox.showwarning(APP_NAME, "No hay datos a guardar en el histórico."); return
+        op_date = self.anchors.day.date(); df = self.df_orig.copy()
+        def done(_):
+            self.status.set("Histórico guardado."); messagebox.showinfo(APP_NAME, f"Histórico guardado: {len(df)} filas del {op_date} (se conservan {HISTORY_RETENTION_DAYS} días).")
+        self.jobs.submit("Guardando histórico…", lambda job: self.history.append(df, op_date), on_done=done,
+                         on_error=lambda e: messagebox.showerror(APP_NAME, f"No se pudo guardar el histórico.\n\n{e}"), cancellable=False)
 
     def _refresh_columns_combobox(self):
         if self.df_view is not None:
             self.cmb_column["values"] = list(self.df_view.columns)
             if len(self.df_view.columns) > 0: self.cmb_column.current(0)
 
-    def _on_double_click_cell(self, event): pass  # simplificado
-
-    def on_exit(self): self.destroy()
+    def on_exit(self):
+        if self.journal.pending and self.df_orig is not None:
+            try: self.journal.compact(session_frame(self.df_orig.copy(), self.anchors.rows()), self.anchors.day.date())
+            except OSError: pass
+        self.jobs.shutdown(); self.journal.close(); self.destroy()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = LogiDeskApp(); app.mainloop()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LogiDesk Win - modo por lotes (sin interfaz): importa archivos de transportistas y genera sus reportes en paralelo.
+
+    python batch.py entrada/*.xlsx -o reports --format xlsx --workers 4
+"""
+import os, sys, glob, argparse, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logidesk_core import APP_NAME, REPORT_DIR, REPORT_FORMATS, process_file, report_names
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="batch", description=f"{APP_NAME} - importación y reportes por lotes (sin interfaz).")
+    p.add_argument("files", nargs="+", help="archivos Excel/CSV (se admiten comodines)")
+    p.add_argument("-o", "--out", default=REPORT_DIR, help="carpeta de salida de los reportes")
+    p.add_argument("--sheet", default=None, help="hoja a importar (por defecto, la primera)")
+    p.add_argument("--format", default="xlsx", choices=sorted(REPORT_FORMATS), help="formato del reporte")
+    p.add_argument("--op-date", default=None, help="fecha operativa AAAA-MM-DD para horas sin fecha (por defecto, hoy)")
+    p.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="procesos en paralelo")
+    args = p.parse_args(argv)
+
+    # en Windows la consola no expande comodines
+    files = [f for pattern in args.files for f in (sorted(glob.glob(pattern)) or [pattern])]
+    # un archivo que encaja en dos patrones se procesa una vez; nombres de salida únicos entre todas las entradas
+    unique = {}
+    for f in files: unique.setdefault(os.path.normcase(os.path.abspath(f)), f)
+    files = list(unique.values()); names = report_names(files)
+    os.makedirs(args.out, exist_ok=True)
+    jobs = [(f, args.out, args.sheet, args.format, args.op_date, names[f]) for f in files]
+    failures = 0
+    def report(path, fn):
+        nonlocal failures
+        try:
+            r = fn(); print(f"OK    {path}: {r['rows']} filas, {len(r['mapped'])} columnas mapeadas -> {r['report']}")
+        except Exception as e:
+            failures += 1; print(f"ERROR {path}: {e}", file=sys.stderr)
+    if args.workers <= 1 or len(jobs) == 1:
+        for job in jobs: report(job[0], lambda: process_file(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs))) as pool:
+            futures = {pool.submit(process_file, *job): job[0] for job in jobs}
+            for fut in as_completed(futures): report(futures[fut], fut.result)
+    print(f"{len(files) - failures}/{len(files)} archivo(s) procesados.")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
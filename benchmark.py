@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LogiDesk Win - banco de pruebas de rendimiento: genera días sintéticos (encabezados sucios, alias, formatos de fecha
+mezclados) y mide importación, pintado de la tabla, filtro, sellado y exportación. Guarda los tiempos en JSON para
+comparar versiones.
+
+    python benchmark.py --sizes 1000,10000,100000 -o bench.json
+    python benchmark.py --sizes 1000,10000,100000 -o bench.json --compare bench_anterior.json
+    xvfb-run -a python benchmark.py ...     (Tk real en Linux sin pantalla; sin pantalla se usa un stub de Tk)
+"""
+import os, sys, json, time, types, random, argparse, platform, statistics, subprocess, tempfile, datetime as dt
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+SOURCES = ("csv", "xlsx")
+STAMP_ROWS = 50  # filas seleccionadas al sellar
+FILTERS = {  # columna, texto tecleado
+    "filter_category": [("TRANSPORTISTA", "garcia")],
+    "filter_text": [("MATRICULA", "12")],
+    "filter_and": [("MUELLE", "m1"), ("OBSERVACIONES", "frio")],
+}
+CARRIERS = ["Transportes García", "ACME Logística", "Núñez e Hijos SL", "TransEuropa", "Frigoríficos del Sur", "Rápidos Martín"]
+DESTINATIONS = ["MADRID", "BARCELONA", "VALENCIA", "SEVILLA", "ZARAGOZA", "BILBAO", "MÁLAGA", "A CORUÑA"]
+STATES = ["PENDIENTE", "EN MUELLE", "CARGANDO", "SALIDO"]
+NOTES = ["", "", "", "", "frío", "Frío -18º", "urgente", "ADR", "paletizado mixto"]
+INCIDENTS = [""] * 18 + ["retraso en muelle", "falta documentación"]
+# encabezados tal como llegan de los proveedores: alias, mayúsculas/espacios sueltos y acentos
+HEADERS = {
+    "TRANSPORTISTA": ["Transportista", " TRANSPORTISTA "],
+    "MATRICULA": ["Matrícula", "MAT.", "matricula"],
+    "MUELLE": ["Dock", "RAMPA", "Muelle"],
+    "ESTADO": ["Status", "estado"],
+    "DESTINO": ["Dest.", "DESTINO"],
+    "LLEGADA": ["ETA", "Hora llegada"],
+    "LLEGADA REAL": ["Check-in", "LLEGADA_REAL", "Entrada real"],
+    "SALIDA REAL": ["Check-out", "Salida real"],
+    "SALIDA TOPE": ["Cut-off", "Hora tope"],
+    "OBSERVACIONES": ["Notas", "Obs."],
+    "INCIDENCIAS": ["Eventos", "Inc."],
+}
+
+# día sintético en el orden de REQUIRED_COLS (con encabezados de proveedor) más una columna ajena y una vacía
+def synthetic_day(n, seed=0, op_date="2026-10-18"):
+    rng = np.random.default_rng(seed); pick = random.Random(seed)
+    base = pd.Timestamp(op_date) + pd.Timedelta("5h")
+    eta = base + pd.to_timedelta(rng.integers(0, 16 * 3600, n) // 60 * 60, unit="s")
+    arrived = eta + pd.to_timedelta(rng.integers(-1800, 3600, n), unit="s")
+    left = arrived + pd.to_timedelta(rng.integers(1200, 4 * 3600, n), unit="s")
+    cutoff = eta + pd.to_timedelta(rng.choice([2, 3, 4], n), unit="h")
+    def mixed(ts, fmts, filled=1.0):
+        # cada fila en uno de los formatos; las no rellenadas quedan vacías
+        out = np.full(n, "", dtype=object); which = rng.integers(0, len(fmts), n)
+        for i, f in enumerate(fmts): out[which == i] = pd.DatetimeIndex(ts[which == i]).strftime(f).to_numpy()
+        out[rng.random(n) >= filled] = ""
+        return out
+    cols = {
+        "TRANSPORTISTA": rng.choice(CARRIERS, n),
+        "MATRICULA": np.char.add(np.char.zfill(rng.integers(0, 10000, n).astype(str), 4), rng.choice(["BCD", "FGH", "KLM", "XYZ"], n)),
+        "MUELLE": np.char.add("M", np.char.zfill(rng.integers(1, 41, n).astype(str), 2)),
+        "ESTADO": rng.choice(STATES, n),
+        "DESTINO": rng.choice(DESTINATIONS, n),
+        "LLEGADA": mixed(eta, ["%H:%M", "%H:%M", "%d/%m/%Y %H:%M"]),
+        "LLEGADA REAL": mixed(arrived, ["%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S"], 0.7),
+        "SALIDA REAL": mixed(left, ["%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M"], 0.45),
+        "SALIDA TOPE": mixed(cutoff, ["%d/%m/%Y %H:%M", "%H:%M"]),
+        "OBSERVACIONES": rng.choice(NOTES, n),
+        "INCIDENCIAS": rng.choice(INCIDENTS, n),
+    }
+    df = pd.DataFrame({pick.choice(HEADERS[c]): v for c, v in cols.items()})
+    df.insert(2, "Ref. interna", np.char.add("R", np.arange(n).astype(str)))
+    df.insert(len(df.columns), "", "")
+    return df
+
+# dos filas de título antes del encabezado (fila 3), como los partes exportados de los ERP de proveedor
+TITLE_ROWS = [["Parte diario de muelles"], []]
+
+def write_day(df, path):
+    if path.endswith(".csv"):
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            for row in TITLE_ROWS: f.write(";".join(row) + "\n")
+            df.to_csv(f, sep=";", index=False)
+        return
+    wb = Workbook(write_only=True); ws = wb.create_sheet("Parte")
+    for row in TITLE_ROWS + [list(df.columns)]: ws.append(row)
+    for row in df.itertuples(index=False, name=None): ws.append([v if v != "" else None for v in row])
+    wb.save(path)
+
+def day_file(data_dir, n, source, seed):
+    # los archivos generados se reutilizan entre ejecuciones (el xlsx grande tarda en escribirse)
+    path = os.path.join(data_dir, f"dia_{n}_{seed}.{source}")
+    if not os.path.exists(path):
+        tmp = path + ".tmp." + source; write_day(synthetic_day(n, seed), tmp); os.replace(tmp, path)
+    return path
+
+# sustitutos mínimos de los widgets de Tk que usan los métodos medidos (modo sin pantalla)
+class _Var:
+    def __init__(self, value=""): self.value = value
+    def get(self): return self.value
+    def set(self, value): self.value = value
+
+class _Entry(_Var):
+    def delete(self, first, last=None): self.value = ""
+    def insert(self, index, text): self.value = str(text)
+
+class _Combobox(_Var):
+    def __init__(self): super().__init__(); self.options = {}
+    def __setitem__(self, key, value): self.options[key] = value
+    def current(self, i): self.value = self.options["values"][i]
+
+class _Tree:
+    def __init__(self): self.cols = []; self.items = {}; self.sel = (); self._focus = ""
+    def __getitem__(self, key): return self.cols
+    def __setitem__(self, key, value): self.cols = list(value)
+    def heading(self, *a, **k): pass
+    def column(self, *a, **k): pass
+    def delete(self, *iids):
+        for i in iids: del self.items[i]
+    def get_children(self, *a): return tuple(self.items)
+    def insert(self, parent, pos, iid=None, values=()):
+        iid = f"I{len(self.items)}" if iid is None else iid; self.items[iid] = tuple(values); return iid
+    def item(self, iid, option=None, values=None):
+        if values is None: return self.items[iid]
+        self.items[iid] = tuple(values)
+    def selection(self): return self.sel
+    def selection_set(self, iids): self.sel = (iids,) if isinstance(iids, str) else tuple(iids)
+    def yview_moveto(self, f): pass
+    def index(self, iid): return list(self.items).index(iid)
+    def focus(self, iid=None):
+        if iid is None: return self._focus
+        self._focus = iid
+
+class _Scrollbar:
+    def set(self, first, last): pass
+
+# trabajos en el mismo hilo: se mide el trabajo completo y un error hace fallar la medición
+class _SyncJobs:
+    def submit(self, label, fn, *args, on_done=None, on_error=None, on_cancel=None, cancellable=True):
+        job = ui.Job(label, cancellable); result = fn(job, *args)
+        if on_done: on_done(result)
+        return job
+    def cancel_all(self): pass
+    def shutdown(self): pass
+
+def stub_app():
+    app = object.__new__(ui.LogiDeskApp)
+    app.df_orig = app.df_view = None; app.anchors = ui.TimeAnchors()
+    app.filter_index = None; app.filters = []; app._filter_job = None
+    app.history = ui.HistoryStore(); app.journal = ui.SessionJournal(); app._compacting = None
+    app.tree = _Tree(); app.vsb = _Scrollbar(); app.status = _Var(); app.filters_text = _Var()
+    app.cmb_column = _Combobox(); app.ent_value = _Entry()
+    app.kpis = None; app.kpi_text = _Var(); app.cmb_kpi_by = _Var("MUELLE"); app.kpi_tree = _Tree()
+    app._vt_df = None; app._vt_top = 0; app._vt_visible = 30; app._vt_iids = {}; app._vt_sel = set()
+    app._vt_rowheight = lambda: 20
+    app.update_idletasks = lambda: None
+    return app
+
+def tk_app():
+    app = ui.LogiDeskApp(); app.update()
+    app.jobs.shutdown()
+    return app
+
+def wizard(path, sheet, header, start):
+    # el asistente solo se usa para _read_df: se evita abrir la ventana y su detección automática
+    w = object.__new__(ui.ImportWizard); w.path = path
+    w.var_sheet = _Var(sheet); w.ent_header = _Var(str(header)); w.ent_start = _Var(str(start))
+    return w
+
+def measure(fn, repeat, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter(); fn(); runs.append(time.perf_counter() - t0)
+    return runs
+
+def case_name(op, source):
+    return f"{op}[{source}]" if source else op
+
+def set_filter(app, conditions):
+    *fixed, (col, needle) = conditions
+    app.filters = list(fixed); app.cmb_column.set(col); app.ent_value.delete(0, "end"); app.ent_value.insert(0, needle)
+
+def bench_size(app, n, sources, data_dir, repeat, seed, log):
+    results = []
+    def record(op, runs, source=None, rows=n):
+        results.append({"op": op, "rows": rows, "source": source, "median": statistics.median(runs), "min": min(runs), "runs": runs})
+        log(f"{case_name(op, source):<26} {n:>8} filas  {statistics.median(runs):9.4f} s")
+    df = None
+    for source in sources:
+        path = day_file(data_dir, n, source, seed)
+        plan = ui_core.plan_import(path)
+        w = wizard(path, plan["sheet"] if source == "xlsx" else "", plan["header"], plan["start"])
+        raw = w._read_df()
+        # abrir el asistente: hojas, muestra y detección de encabezado/mapeo, sin la lectura completa
+        record("sniff", measure(lambda: ui_core.plan_import(path), repeat, setup=ui_core._import_cache.clear), source)
+        record("read_df", measure(w._read_df, repeat, setup=ui_core._import_cache.clear), source)
+        if df is None:
+            op_date = app.anchors.op_date
+            record("apply_mapping", measure(lambda: ui_core.apply_mapping(raw, plan["mapping"], op_date), repeat))
+            df = ui_core.apply_mapping(raw, plan["mapping"], op_date)
+    app._set_data(df); app.update_idletasks()
+    record("populate_table", measure(lambda: (app._populate_table(df), app.update_idletasks()), repeat))
+    for op, conditions in FILTERS.items():
+        def setup(conditions=conditions):
+            app.filter_index = ui.FilterIndex(df); set_filter(app, conditions)
+        record(op, measure(lambda: (app.apply_filter(), app.update_idletasks()), repeat, setup))
+    app.clear_filter()
+    labels = list(df.index[np.linspace(0, len(df) - 1, min(STAMP_ROWS, len(df))).astype(int)])
+    def select(): app._vt_sel = set(labels)
+    record("stamp", measure(lambda: (app._set_timestamp_for_selected("LLEGADA REAL"), app.update_idletasks()), repeat, select))
+    record("export_daily_report", measure(app.export_daily_report, repeat))
+    return results
+
+def git_revision():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HERE, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError): return None
+
+def compare(results, meta, baseline_path, threshold, min_delta, log):
+    # mediana actual / mediana anterior por (operación, filas, origen); True si alguna supera el umbral
+    # (las diferencias de pocos milisegundos son ruido y no cuentan)
+    with open(baseline_path, "r", encoding="utf-8") as f: baseline = json.load(f)
+    old = {(r["op"], r["rows"], r["source"]): r["median"] for r in baseline["results"]}
+    log(f"\nComparación con {os.path.basename(baseline_path)} ({baseline['meta'].get('revision') or '?'}):")
+    if baseline["meta"].get("mode") != meta["mode"]: log(f"Aviso: modo distinto ({baseline['meta'].get('mode')} frente a {meta['mode']}); los tiempos de pintado no son comparables.")
+    regressed = False
+    for r in results:
+        prev = old.get((r["op"], r["rows"], r["source"]))
+        if not prev: continue
+        ratio = r["median"] / prev; slow = ratio > threshold and r["median"] - prev > min_delta; regressed |= slow
+        log(f"{case_name(r['op'], r['source']):<26} {r['rows']:>8} filas  {prev:9.4f} -> {r['median']:9.4f} s  x{ratio:5.2f}{'  REGRESIÓN' if slow else ''}")
+    return regressed
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def main(argv=None):
+    global ui, ui_core
+    p = argparse.ArgumentParser(prog="benchmark", description="LogiDesk Win - medición de rendimiento con días sintéticos.")
+    p.add_argument("--sizes", default="1000,10000,100000", help="filas por día, separadas por comas (p. ej. 1000,10000,100000,500000)")
+    p.add_argument("--sources", default=",".join(SOURCES), help="formatos de archivo a importar (csv,xlsx)")
+    p.add_argument("-r", "--repeat", type=int, default=3, help="repeticiones por medición (se guarda la mediana)")
+    p.add_argument("--seed", type=int, default=0, help="semilla del generador")
+    p.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "logidesk-bench"), help="carpeta de días generados (se reutilizan)")
+    p.add_argument("-o", "--out", default="benchmark.json", help="archivo JSON de resultados")
+    p.add_argument("--compare", default=None, help="JSON de una ejecución anterior para comparar")
+    p.add_argument("--threshold", type=float, default=1.25, help="factor de empeoramiento que cuenta como regresión")
+    p.add_argument("--min-delta", type=float, default=0.01, help="segundos de diferencia por debajo de los cuales no hay regresión")
+    p.add_argument("--stub", action="store_true", help="no abrir Tk aunque haya pantalla")
+    args = p.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    if any(s not in SOURCES for s in sources): p.error(f"formatos admitidos: {', '.join(SOURCES)}")
+    out_path = os.path.abspath(args.out); data_dir = os.path.abspath(args.data_dir)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    os.makedirs(data_dir, exist_ok=True)
+
+    # sesión, histórico, perfiles y reportes en una carpeta temporal: las rutas se fijan al importar el núcleo
+    work = tempfile.mkdtemp(prefix="logidesk-bench-"); os.chdir(work)
+    sys.path.insert(0, HERE)
+    import app as ui, logidesk_core as ui_core
+    ui.messagebox = types.SimpleNamespace(**{k: (lambda *a, **kw: None) for k in ("showinfo", "showwarning", "showerror")}, askyesno=lambda *a, **kw: True)
+    os.makedirs(ui.REPORT_DIR, exist_ok=True)
+    app, mode = None, "stub"
+    if not args.stub:
+        try: app, mode = tk_app(), "tk"
+        except ui.tk.TclError: pass
+    if app is None: app = stub_app()
+    app.jobs = _SyncJobs()
+    print(f"Modo: {mode} · carpeta de trabajo: {work}")
+
+    results = []
+    try:
+        for n in sizes: results += bench_size(app, n, sources, data_dir, args.repeat, args.seed, print)
+    finally:
+        if mode == "tk": app.destroy()
+    meta = {
+        "revision": git_revision(), "date": dt.datetime.now().isoformat(timespec="seconds"), "mode": mode, "repeat": args.repeat, "seed": args.seed,
+        "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count(),
+    }
+    with open(out_path, "w", encoding="utf-8") as f: json.dump({"meta": meta, "results": results}, f, indent=1)
+    print(f"Resultados: {out_path}")
+    return 1 if baseline and compare(results, meta, baseline, args.threshold, args.min_delta, print) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
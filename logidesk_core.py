@@ -0,0 +1,901 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LogiDesk Win - núcleo sin interfaz: importación, fechas, filtros, histórico, reportes y sesión.
+No importa tkinter: lo usan tanto la aplicación (app.py) como el modo por lotes (batch.py).
+"""
+import os, re, csv, glob, json, shutil, sqlite3, hashlib, zipfile, posixpath, itertools, threading, unicodedata, datetime as dt
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+import numpy as np
+from openpyxl import Workbook
+import pandas as pd
+
+APP_NAME = "LogiDesk Win"
+BASE_DIR = os.path.abspath(".")
+HISTORY_DIR = os.path.join(BASE_DIR, "history")
+REPORT_DIR  = os.path.join(BASE_DIR, "reports")
+SESSION     = os.path.join(BASE_DIR, "current_session.csv")
+JOURNAL     = os.path.join(BASE_DIR, "current_session.journal")
+PROFILES    = os.path.join(BASE_DIR, "import_profiles.json")
+HISTORY_DB  = os.path.join(HISTORY_DIR, "history.sqlite")
+HISTORY_RETENTION_DAYS = 30
+
+REQUIRED_COLS = [
+    "TRANSPORTISTA","MATRICULA","MUELLE","ESTADO","DESTINO",
+    "LLEGADA","LLEGADA REAL","SALIDA REAL","SALIDA TOPE","OBSERVACIONES","INCIDENCIAS"
+]
+
+ALIASES = {
+    "TRANSPORTISTA": ["TRANSPORTISTA"],
+    "MATRICULA": ["MATRICULA","MATRÍCULA","MAT."],
+    "MUELLE": ["MUELLE","DOCK","RAMPA"],
+    "ESTADO": ["ESTADO","STATUS"],
+    "DESTINO": ["DESTINO","DEST."],
+    "LLEGADA": ["LLEGADA","HORA LLEGADA","ETA"],
+    "LLEGADA REAL": ["LLEGADA REAL","LLEGADA_REAL","CHECK-IN","ENTRADA REAL"],
+    "SALIDA REAL": ["SALIDA REAL","SALIDA_REAL","CHECK-OUT"],
+    "SALIDA TOPE": ["SALIDA TOPE","SALIDA_TOPE","CUT-OFF","HORA TOPE"],
+    "OBSERVACIONES": ["OBSERVACIONES","OBS.","NOTAS"],
+    "INCIDENCIAS": ["INCIDENCIAS","INC.","EVENTOS"],
+}
+
+DT_COLS = ["LLEGADA","LLEGADA REAL","SALIDA REAL","SALIDA TOPE"]
+DT_FORMATS = ("%Y-%m-%d %H:%M:%S","%d/%m/%Y %H:%M","%d/%m/%Y %H:%M:%S","%H:%M","%H:%M:%S")
+TIME_ONLY_FORMATS = ("%H:%M","%H:%M:%S")
+DT_SAMPLE = 200  # valores no vacíos usados para detectar el formato de una columna
+NA_STRINGS = ["", "nan", "NaN", "NaT", "None", "<NA>"]
+
+CATEGORY_COLS = ["TRANSPORTISTA","MUELLE","ESTADO","DESTINO"]
+FILTER_CANDIDATE_COLS = CATEGORY_COLS
+DISPLAY_DT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class JobCancelled(Exception):
+    pass
+
+# trabajo en segundo plano: la función recibe el Job para informar progreso y atender la cancelación
+class Job:
+    def __init__(self, label, cancellable=True):
+        self.label = label; self.fraction = None; self.cancellable = cancellable; self._cancel = threading.Event()
+
+    def cancel(self): self._cancel.set()
+
+    @property
+    def cancelled(self): return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set(): raise JobCancelled()
+
+    def progress(self, fraction):
+        self.check(); self.fraction = fraction
+
+def fold_text(value):
+    return unicodedata.normalize("NFKD", str(value).lower()).encode("ascii", "ignore").decode("ascii")
+
+# serie -> minúsculas sin acentos; se pliega cada valor distinto una sola vez
+def fold_series(s):
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    folded = np.array([fold_text(u) for u in uniques] + [""], dtype=object)
+    return folded[codes]
+
+def norm_header(name):
+    return " ".join(fold_text(name).split())
+
+ALIAS_LOOKUP = {" ".join(fold_text(a).split()): std for std, aliases in ALIASES.items() for a in aliases}
+
+# fecha operativa -> medianoche a la que se anclan las horas sueltas (hoy por defecto)
+def op_day(op_date=None):
+    return pd.Timestamp(op_date if op_date is not None else dt.date.today()).normalize()
+
+# formato de DT_FORMATS que más valores de la muestra reconoce (o None)
+def detect_dt_format(values):
+    sample = values.dropna().head(DT_SAMPLE)
+    best, hits = None, 0
+    for fmt in DT_FORMATS:
+        n = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if n > hits: best, hits = fmt, n
+    return best
+
+# columna completa -> (datetime64, máscara de horas sueltas), vectorizado: primero el formato detectado en la
+# muestra, las celdas que no encajan prueban el resto de DT_FORMATS y al final la inferencia dayfirst.
+# Las horas sueltas (HH:MM) se anclan a la fecha operativa (hoy por defecto) y quedan marcadas en la máscara.
+def parse_dt_times(s, op_date=None):
+    time_only = np.zeros(len(s), dtype=bool)
+    if pd.api.types.is_datetime64_any_dtype(s): return s, time_only
+    op_date = op_day(op_date)
+    vals = s.astype(str).str.strip()
+    vals = vals.mask(vals.isin(NA_STRINGS))
+    res = np.full(len(vals), np.datetime64("NaT"), dtype="datetime64[ns]")
+    pending = vals.notna().to_numpy().copy()
+    first = detect_dt_format(vals[pending])
+    for fmt in ([first] if first else []) + [f for f in DT_FORMATS if f != first]:
+        pos = np.flatnonzero(pending)
+        if not len(pos): break
+        parsed = pd.to_datetime(vals.iloc[pos], format=fmt, errors="coerce")
+        if fmt in TIME_ONLY_FORMATS:
+            parsed = op_date + (parsed - parsed.dt.normalize()); time_only[pos] = parsed.notna().to_numpy()
+        res[pos] = parsed.to_numpy(dtype="datetime64[ns]")
+        pending[pos] = np.isnat(res[pos])
+    pos = np.flatnonzero(pending)
+    if len(pos):
+        res[pos] = pd.to_datetime(vals.iloc[pos], errors="coerce", dayfirst=True, format="mixed").to_numpy(dtype="datetime64[ns]")
+    return pd.Series(res, index=s.index, name=s.name), time_only
+
+def parse_dt_column(s, op_date=None):
+    return parse_dt_times(s, op_date)[0]
+
+# horas sueltas ancladas a la fecha operativa: por columna de DT_COLS, las filas que eran solo hora.
+# set_op_date() mueve solo esas celdas al día nuevo (los sellos y las fechas completas no cambian) y la
+# sesión las guarda como hora, así que al restaurar se vuelven a anclar
+class TimeAnchors:
+    def __init__(self, op_date=None, masks=None):
+        self.op_date = op_date; self.day = op_day(op_date); self.masks = masks or {}
+
+    def update(self, col, labels, time_only):
+        if col in self.masks: self.masks[col].loc[list(labels)] = time_only
+
+    def set_op_date(self, df, op_date):
+        # mueve in situ las celdas ancladas de df -> {columna: filas movidas}
+        day = op_day(op_date); delta = day - self.day; moved = {}
+        self.op_date = op_date; self.day = day
+        if not delta: return moved
+        for c, m in self.masks.items():
+            labels = m.index[m.to_numpy()]
+            if len(labels): df.loc[labels, c] = df.loc[labels, c] + delta; moved[c] = labels
+        return moved
+
+    def rows(self):
+        # copia de las filas ancladas por columna, para session_frame en segundo plano
+        return {c: m.index[m.to_numpy()] for c, m in self.masks.items()}
+
+# copia para el snapshot de la sesión: las celdas ancladas se escriben como hora, sin fecha
+def session_frame(df, rows):
+    for c, labels in rows.items():
+        if not len(labels): continue
+        s = df[c].dt.strftime(DISPLAY_DT_FORMAT); s.loc[labels] = df.loc[labels, c].dt.strftime(TIME_ONLY_FORMATS[-1])
+        df[c] = s
+    return df
+
+# modelo tipado en memoria: categorías para columnas de pocos valores, datetime64 para DT_COLS y
+# texto (sin NaN) para el resto; solo se formatea a texto al mostrar o exportar
+def normalize_frame(df, op_date=None):
+    return normalize_anchored(df, op_date)[0]
+
+# -> (modelo tipado, TimeAnchors con las horas sueltas ancladas a op_date), parseando cada columna una vez
+def normalize_anchored(df, op_date=None):
+    out = {}; masks = {}
+    for c in df.columns:
+        s = df[c]
+        if c in DT_COLS:
+            out[c], mask = parse_dt_times(s, op_date); masks[c] = pd.Series(mask, index=df.index)
+        else:
+            s = s.astype(object).where(s.notna(), "").astype(str)
+            out[c] = s.astype("category") if c in CATEGORY_COLS else s
+    return pd.DataFrame(out, index=df.index), TimeAnchors(op_date, masks)
+
+def typed_value(col, text, op_date=None):
+    # texto editado -> valor del tipo de la columna (ValueError si no es una fecha válida)
+    if col not in DT_COLS: return text
+    if not str(text).strip(): return pd.NaT
+    value = parse_dt_column(pd.Series([text]), op_date).iloc[0]
+    if pd.isna(value): raise ValueError(f"'{text}' no es una fecha/hora válida")
+    return value
+
+def display_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)): return ""
+    if isinstance(value, pd.Timestamp): return value.strftime(DISPLAY_DT_FORMAT)
+    return str(value)
+
+def display_frame(df):
+    out = df.astype(object)
+    for c in df.columns:
+        if c in DT_COLS and pd.api.types.is_datetime64_any_dtype(df[c]): out[c] = df[c].dt.strftime(DISPLAY_DT_FORMAT)
+    return out.where(out.notna(), "")
+
+def set_cells(df, labels, col, value):
+    # asignación in situ; un valor nuevo en una columna categórica se añade antes a sus categorías
+    s = df[col]
+    if isinstance(s.dtype, pd.CategoricalDtype) and value not in s.cat.categories:
+        df[col] = s.cat.add_categories([value])
+    df.loc[labels, col] = value
+
+# índices de texto plegado por columna, construidos una vez al importar; las condiciones
+# se combinan con AND y, al teclear, una aguja que amplía la anterior solo busca entre sus candidatos
+class FilterIndex:
+    def __init__(self, df):
+        self.index = df.index
+        self.cols = {c: fold_series(df[c]) for c in df.columns}
+        self._buckets = {c: self._build_buckets(c) for c in FILTER_CANDIDATE_COLS if c in self.cols}
+        self._last = {}
+
+    def _build_buckets(self, col):
+        # valor distinto -> posiciones de fila
+        return pd.Series(self.cols[col]).groupby(self.cols[col]).indices
+
+    def match(self, col, needle):
+        needle = fold_text(needle.strip())
+        if not needle: return None
+        if col in FILTER_CANDIDATE_COLS:
+            if col not in self._buckets: self._buckets[col] = self._build_buckets(col)
+            hits = [p for v, p in self._buckets[col].items() if needle in v]
+            return np.sort(np.concatenate(hits)) if hits else np.empty(0, dtype=np.intp)
+        last = self._last.get(col)
+        cand = last[1] if last and needle.startswith(last[0]) else np.arange(len(self.index))
+        pos = cand[np.fromiter((needle in v for v in self.cols[col][cand]), dtype=bool, count=len(cand))]
+        self._last[col] = (needle, pos)
+        return pos
+
+    def query(self, conditions):
+        # posiciones que cumplen todas las condiciones (None = sin restricción)
+        pos = None
+        for col, needle in conditions:
+            p = self.match(col, needle)
+            if p is not None: pos = p if pos is None else np.intersect1d(pos, p, assume_unique=True)
+        return pos
+
+    def update(self, labels, col, value):
+        self.cols[col][self.index.get_indexer(list(labels))] = fold_text(value)
+        self._buckets.pop(col, None); self._last.pop(col, None)
+
+    def update_values(self, labels, col, values):
+        # un valor distinto por fila (p. ej. horas movidas de día)
+        self.cols[col][self.index.get_indexer(list(labels))] = fold_series(values)
+        self._buckets.pop(col, None); self._last.pop(col, None)
+
+IMPORT_CACHE_SIZE = 8  # lecturas de importación guardadas en memoria (LRU)
+IMPORT_CHUNK_ROWS = 20000  # filas por bloque al leer CSV (punto de cancelación)
+SNIFF_ROWS = 30  # filas leídas para detectar encabezado y columnas en la previsualización
+_import_cache = OrderedDict()
+_import_lock = threading.Lock()
+
+CSV_DELIMITERS = ",;\t|"
+
+def cached_read(key, loader):
+    # la carga va fuera del lock: una lectura larga en segundo plano no bloquea la previsualización
+    with _import_lock:
+        if key in _import_cache:
+            _import_cache.move_to_end(key); return _import_cache[key]
+    value = loader()
+    with _import_lock:
+        _import_cache[key] = value
+        while len(_import_cache) > IMPORT_CACHE_SIZE: _import_cache.popitem(last=False)
+    return value
+
+def file_key(path):
+    # un archivo modificado (otro mtime) nunca reutiliza lecturas anteriores
+    path = os.path.abspath(path); return path, os.path.getmtime(path)
+
+def list_sheets(path):
+    def load():
+        if os.path.splitext(path)[1].lower() == ".xls":
+            with pd.ExcelFile(path) as xl: return xl.sheet_names
+        with zipfile.ZipFile(path) as zf: return [name for name, _ in _xlsx_book(zf)[0]]
+    return cached_read(("sheets",) + file_key(path), load)
+
+# lectura mínima de .xlsx para el asistente: abrir el libro (pandas/openpyxl, incluso read_only) parsea todo
+# sharedStrings, segundos en un día grande. Aquí se leen en streaming workbook.xml, las primeras filas de la hoja
+# y solo las cadenas compartidas que usan esas filas
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def _xlsx_rels(zf, part, kind):
+    # relaciones de una parte del paquete cuyo Type acaba en kind -> {id: ruta dentro del zip}
+    folder, name = posixpath.split(part); rels = posixpath.join(folder, "_rels", name + ".rels")
+    if rels not in zf.namelist(): return {}
+    out = {}
+    for el in ET.fromstring(zf.read(rels)):
+        if not el.get("Type", "").endswith(kind): continue
+        target = el.get("Target", "")
+        out[el.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+    return out
+
+def _xlsx_book(zf):
+    # -> ([(nombre de hoja, parte XML)] en el orden del libro, parte de sharedStrings o None, parte de estilos o None)
+    book = next(iter(_xlsx_rels(zf, "", "/officeDocument").values()), "xl/workbook.xml")
+    parts = _xlsx_rels(zf, book, "/worksheet")
+    sheets = [(el.get("name"), parts.get(next((v for k, v in el.attrib.items() if _local(k) == "id"), None)))
+              for el in ET.fromstring(zf.read(book)).iter() if _local(el.tag) == "sheet"]
+    return (sheets, next(iter(_xlsx_rels(zf, book, "/sharedStrings").values()), None),
+            next(iter(_xlsx_rels(zf, book, "/styles").values()), None))
+
+XLSX_DATE_FMT_IDS = set(range(14, 23)) | {45, 46, 47}  # formatos de fecha/hora integrados de Excel
+
+def _xlsx_date_styles(zf, part):
+    # índices de estilo de celda (atributo s) con formato de fecha u hora
+    if part is None: return set()
+    root = ET.fromstring(zf.read(part))
+    custom = {int(el.get("numFmtId")) for el in root.iter() if _local(el.tag) == "numFmt"
+              and re.search(r"[dmyhs]", re.sub(r'"[^"]*"|\[[^\]]*\]', "", el.get("formatCode", "")).lower())}
+    xfs = next((el for el in root if _local(el.tag) == "cellXfs"), [])
+    return {i for i, xf in enumerate(xfs) if int(xf.get("numFmtId", 0)) in XLSX_DATE_FMT_IDS | custom}
+
+def _xlsx_text(el):
+    # texto de <si>/<is>: su <t> o las <t> de cada tramo <r> (sin la fonética de <rPh>)
+    parts = []
+    for child in el:
+        tag = _local(child.tag)
+        if tag == "t": parts.append(child.text or "")
+        elif tag == "r": parts += [t.text or "" for t in child if _local(t.tag) == "t"]
+    return "".join(parts)
+
+def _xlsx_cell(c, dates):
+    # valor de <c>; las cadenas compartidas quedan como ("s", índice) hasta leer sharedStrings
+    kind = c.get("t", "n"); v = next((x.text for x in c if _local(x.tag) == "v"), None)
+    if kind == "inlineStr": return _xlsx_text(next((x for x in c if _local(x.tag) == "is"), []))
+    if v is None: return None
+    if kind == "s": return ("s", int(v))
+    if kind == "b": return v == "1"
+    if kind in ("str", "e"): return v
+    f = float(v)
+    if int(c.get("s", 0)) in dates:
+        ts = (pd.Timestamp("1899-12-30") + pd.Timedelta(days=f)).round("s"); return ts.time() if 0 <= f < 1 else ts
+    return int(f) if f.is_integer() else f
+
+def _xlsx_col(ref):
+    # "AB12" -> 27
+    n = 0
+    for ch in re.match(r"[A-Z]+", ref).group(): n = n * 26 + ord(ch) - 64
+    return n - 1
+
+def _xlsx_strings(zf, part, last):
+    # cadenas compartidas 0..last, leyendo sharedStrings.xml solo hasta ahí
+    out = []
+    with zf.open(part) as f:
+        for _, el in ET.iterparse(f):
+            if _local(el.tag) != "si": continue
+            out.append(_xlsx_text(el)); el.clear()
+            if len(out) > last: break
+    return out
+
+def read_xlsx_head(path, sheet, nrows=SNIFF_ROWS):
+    # primeras nrows filas de una hoja (por nombre o posición) en crudo, como read_excel(header=None, nrows=...)
+    with zipfile.ZipFile(path) as zf:
+        sheets, shared, styles = _xlsx_book(zf); dates = _xlsx_date_styles(zf, styles)
+        part = sheets[sheet][1] if isinstance(sheet, int) else dict(sheets)[sheet]
+        rows = []
+        with zf.open(part) as f:
+            for _, el in ET.iterparse(f):
+                if _local(el.tag) != "row": continue
+                r = int(el.get("r", len(rows) + 1))
+                if r > nrows: break
+                rows += [[] for _ in range(r - 1 - len(rows))]
+                row = []
+                for c in (x for x in el if _local(x.tag) == "c"):
+                    i = _xlsx_col(c.get("r")) if c.get("r") else len(row)
+                    row += [None] * (i - len(row)); row.append(_xlsx_cell(c, dates))
+                rows.append(row); el.clear()
+        wanted = [v[1] for row in rows for v in row if isinstance(v, tuple)]
+        strings = _xlsx_strings(zf, shared, max(wanted)) if wanted and shared else []
+    def value(v):
+        if isinstance(v, tuple): v = strings[v[1]] if v[1] < len(strings) else None
+        return None if v == "" else v  # como read_excel: texto vacío = celda vacía
+    return pd.DataFrame([[value(v) for v in row] for row in rows])
+
+def sniff_dialect(lines):
+    # mismo separador en previsualización e importación: solo separadores habituales (un espacio en un encabezado
+    # no lo es) y sin las filas de título/vacías de arriba, que no tienen ninguno
+    body = [l for l in lines if any(d in l for d in CSV_DELIMITERS)]
+    try: return csv.Sniffer().sniff("".join(body[:10]), delimiters=CSV_DELIMITERS)
+    except csv.Error: return csv.excel
+
+def read_sample(path, sheet, nrows=SNIFF_ROWS):
+    # primeras filas en crudo (sin encabezado): E/S acotada aunque el archivo sea grande
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+            head = list(itertools.islice(f, nrows))
+        return pd.DataFrame(list(csv.reader(head, sniff_dialect(head))))
+    if ext == ".xls": return pd.read_excel(path, sheet_name=sheet, header=None, nrows=nrows)
+    return read_xlsx_head(path, sheet, nrows)
+
+def sniff_header_row(sample):
+    # fila (1-based) con más celdas reconocidas en ALIASES; 1 si ninguna encaja
+    best, score = 1, 0
+    for i, row in enumerate(sample.itertuples(index=False, name=None)):
+        n = len({ALIAS_LOOKUP[h] for h in (norm_header(v) for v in row if pd.notna(v)) if h in ALIAS_LOOKUP})
+        if n > score: best, score = i + 1, n
+    return best
+
+def header_names(sample, header_visible):
+    # mismos nombres que pandas daría a las columnas (duplicados con sufijo .1, .2; vacías fuera)
+    names, seen = [], {}
+    for v in sample.iloc[header_visible - 1]:
+        name = "" if pd.isna(v) else str(v).strip()
+        if not name: continue
+        if name in seen: seen[name] += 1; name = f"{name}.{seen[name]}"
+        else: seen[name] = 0
+        names.append(name)
+    return names
+
+def read_import_table(path, sheet, header_visible, start_visible, job=None):
+    # filas visibles 1-based: se saltan las anteriores al encabezado y las que hay entre encabezado y datos
+    header_idx = max(header_visible - 1, 0)
+    skiprows = list(range(0, header_idx)) + list(range(header_idx + 1, start_visible - 1))
+    skiprows, header_idx = (skiprows or None), 0
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        chunks = []
+        with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+            sep = sniff_dialect(list(itertools.islice(f, SNIFF_ROWS))).delimiter
+        for chunk in pd.read_csv(path, sep=sep, header=header_idx, skiprows=skiprows, chunksize=IMPORT_CHUNK_ROWS):
+            if job is not None: job.check()
+            chunks.append(chunk)
+        df = pd.concat(chunks)
+    else:
+        df = pd.read_excel(path, sheet_name=sheet, header=header_idx, skiprows=skiprows)
+    # limpiar columnas unnamed
+    new_cols = []
+    for c in df.columns:
+        name = str(c).strip()
+        if name.startswith("Unnamed"):
+            name = ""
+        new_cols.append(name)
+    df.columns = new_cols
+    df = df.loc[:, [c for c in df.columns if str(c).strip() != ""]]
+    df = df.dropna(how="all").reset_index(drop=True)
+    return df
+
+def load_import_table(path, sheet, header_visible, start_visible, job=None):
+    key = ("table",) + file_key(path) + (sheet, header_visible, start_visible)
+    return cached_read(key, lambda: read_import_table(path, sheet, header_visible, start_visible, job))
+
+def auto_map(cols):
+    mapping = {}
+    for c in cols:
+        std = ALIAS_LOOKUP.get(norm_header(c))
+        if std and std not in mapping: mapping[std] = c
+    return mapping
+
+def profile_key(sheet, cols):
+    # firma de hoja + columnas: el mismo formato de proveedor reutiliza su perfil aunque cambie el nombre del archivo
+    sig = f"{sheet}|" + "|".join(norm_header(c) for c in cols)
+    return hashlib.sha1(sig.encode("utf-8")).hexdigest()[:16]
+
+def load_profiles():
+    if os.path.exists(PROFILES):
+        try:
+            with open(PROFILES, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+    return {}
+
+def save_profiles(p):
+    try:
+        with open(PROFILES, "w", encoding="utf-8") as f:
+            json.dump(p, f, indent=2, ensure_ascii=False)
+    except Exception:
+        pass
+
+# columnas del archivo -> texto con las columnas estándar (REQUIRED_COLS, índice 0..n-1 = id de fila estable)
+def map_columns(df, mapping):
+    out = {}
+    for std in REQUIRED_COLS:
+        src = mapping.get(std)
+        out[std] = df[src].to_numpy() if src in df.columns else [""] * len(df)
+    return pd.DataFrame(out)
+
+def apply_mapping(df, mapping, op_date=None):
+    return normalize_frame(map_columns(df, mapping), op_date)
+
+# hoja, filas y mapeo que propondría el asistente: perfil guardado para la firma de columnas o ALIASES
+def plan_import(path, sheet=None, profiles=None):
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xls"):
+        sheet = sheet or list_sheets(path)[0]; sheet_name = sheet
+    else:
+        sheet, sheet_name = 0, ""
+    sample = read_sample(path, sheet)
+    header = sniff_header_row(sample); cols = header_names(sample, header)
+    profile = (load_profiles() if profiles is None else profiles).get(profile_key(sheet_name, cols))
+    if profile:
+        mapping = {k: v for k, v in profile.get("mapping", {}).items() if v in cols}
+        return {"sheet": sheet, "header": header, "start": profile.get("start") or header + 1, "mapping": mapping}
+    return {"sheet": sheet, "header": header, "start": header + 1, "mapping": auto_map(cols)}
+
+# sesión = snapshot CSV (se reemplaza de forma atómica) + diario de ediciones append-only (una línea JSON
+# por edición/sellado, con fsync). Cada edición cuesta lo mismo sea cual sea el tamaño del día; al arrancar se
+# restaura el snapshot y se reaplica el diario. La compactación se parte en dos:
+# rotate() en el hilo de Tk, en el mismo instante en que se copia df_orig (el diario pasa a JOURNAL.1 y las
+# ediciones siguientes van a un diario nuevo), y write_snapshot() en segundo plano, que solo borra JOURNAL.1
+# si no ha habido otra rotación entretanto. Reaplicar un registro ya incluido en el snapshot no cambia nada
+class SessionJournal:
+    def __init__(self, snapshot=SESSION, journal=JOURNAL):
+        self.snapshot = snapshot; self.journal = journal; self.rotated = journal + ".1"
+        self.pending = 0; self.op_date = None; self._f = None
+        self._lock = threading.Lock(); self._seq = 0; self._written = 0
+
+    def append(self, labels, col, value):
+        self._write({"rows": [int(l) for l in labels], "col": col, "val": value})
+
+    def append_op_date(self, op_date):
+        # fecha a la que están ancladas las horas sueltas (que la sesión guarda como HH:MM:SS)
+        self._write({"op_date": str(op_date)})
+
+    def _write(self, rec):
+        if self._f is None: self._f = open(self.journal, "a", encoding="utf-8")
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._f.flush(); os.fsync(self._f.fileno()); self.pending += 1
+
+    def rotate(self):
+        # -> (seq, ediciones rotadas) para write_snapshot; si una compactación anterior falló, JOURNAL.1
+        # sigue ahí y el diario actual se le añade (sin su posible última línea a medio escribir)
+        self.close()
+        with self._lock:
+            if os.path.exists(self.journal):
+                if os.path.exists(self.rotated):
+                    with open(self.rotated, "rb+") as dst, open(self.journal, "rb") as src:
+                        data = dst.read(); dst.seek(data.rfind(b"\n") + 1); dst.truncate()
+                        shutil.copyfileobj(src, dst); dst.flush(); os.fsync(dst.fileno())
+                    os.remove(self.journal)
+                else: os.replace(self.journal, self.rotated)
+            self._seq += 1; n, self.pending = self.pending, 0
+            return self._seq, n
+
+    def write_snapshot(self, df, seq, op_date=None):
+        # hilo de trabajo; False si ya hay un snapshot más reciente (el de seq se descarta).
+        # op_date va en una primera línea "#{json}" del mismo archivo (se reemplaza junto con los datos)
+        if seq < self._written: return False
+        tmp = f"{self.snapshot}.{seq}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            if op_date is not None: f.write("#" + json.dumps({"op_date": str(op_date)}) + "\n")
+            df.to_csv(f, index=True, index_label="_row"); f.flush(); os.fsync(f.fileno())
+        with self._lock:
+            if seq < self._written: os.remove(tmp); return False
+            os.replace(tmp, self.snapshot); self._written = seq
+            # si se corta aquí, JOURNAL.1 se reaplica sobre el snapshot nuevo con el mismo resultado
+            if seq == self._seq and os.path.exists(self.rotated): os.remove(self.rotated)
+        return True
+
+    def compact(self, df, op_date=None):
+        # versión síncrona (al salir)
+        seq, _ = self.rotate(); self.write_snapshot(df, seq, op_date)
+
+    def reset(self):
+        # datos nuevos: el diario y el snapshot anteriores ya no valen; las escrituras en curso se descartan.
+        # hasta que se escriba el snapshot nuevo no hay sesión que restaurar (el archivo importado sigue ahí)
+        self.close()
+        with self._lock:
+            self._seq += 1; self._written = self._seq; self.pending = 0; self.op_date = None
+            for path in (self.journal, self.rotated, self.snapshot):
+                if os.path.exists(path): os.remove(path)
+
+    def restore(self):
+        # -> DataFrame de texto; la fecha operativa guardada (o None, snapshots antiguos) queda en self.op_date
+        if not os.path.exists(self.snapshot): return None
+        with open(self.snapshot, "r", encoding="utf-8", newline="") as f:
+            first = f.readline()
+            if first.startswith("#"): self.op_date = dt.date.fromisoformat(json.loads(first[1:])["op_date"])
+            else: f.seek(0)
+            df = pd.read_csv(f, dtype=str, keep_default_na=False)
+        df = df.set_index("_row") if "_row" in df.columns else df
+        df.index = df.index.astype(int); df.index.name = None
+        for path in (self.rotated, self.journal):
+            if not os.path.exists(path): continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try: rec = json.loads(line)
+                    except json.JSONDecodeError: break  # última línea a medio escribir
+                    if "op_date" in rec: self.op_date = dt.date.fromisoformat(rec["op_date"]); continue
+                    if rec["col"] not in df.columns: continue
+                    rows = [r for r in rec["rows"] if r in df.index]
+                    if rows: df.loc[rows, rec["col"]] = rec["val"]; self.pending += 1
+        return df
+
+    def close(self):
+        if self._f is not None: self._f.close(); self._f = None
+
+AGG_COLS = ["total","con_llegada_real","con_salida_real","con_salida_tope","retrasos","con_estancia","estancia_seg"]
+INCIDENT_COLS = ["TRANSPORTISTA","MATRICULA","MUELLE","ESTADO","DESTINO","INCIDENCIAS"]
+
+def _text(s):
+    return s.astype(object).where(s.notna(), "").astype(str).to_numpy()
+
+# aportación de cada fila a AGG_COLS (matriz n x len(AGG_COLS)); misma definición en reportes y panel en vivo
+def row_contrib(lr, sr, st):
+    stay = (sr - lr).dt.total_seconds()
+    return np.column_stack([
+        np.ones(len(lr)), lr.notna().to_numpy(), sr.notna().to_numpy(), (sr.notna() & st.notna()).to_numpy(),
+        (sr > st).to_numpy(), stay.notna().to_numpy(), stay.fillna(0).to_numpy(),
+    ]).astype(float)
+
+# contadores por (TRANSPORTISTA, MUELLE) a partir de las columnas de fecha ya parseadas, en una sola
+# pasada vectorizada; los resúmenes por transportista y por muelle salen de esta tabla pequeña
+def aggregate_rows(df, lr, sr, st):
+    g = pd.DataFrame(row_contrib(lr, sr, st), columns=AGG_COLS)
+    g.insert(0, "TRANSPORTISTA", _text(df["TRANSPORTISTA"])); g.insert(1, "MUELLE", _text(df["MUELLE"]))
+    g = g.groupby(["TRANSPORTISTA","MUELLE"], sort=False)[AGG_COLS].sum().reset_index()
+    g[AGG_COLS[:-1]] = g[AGG_COLS[:-1]].astype(int)
+    return g
+
+def _fmt_stay(seconds):
+    return str(pd.Timedelta(seconds=seconds).round("s")) if pd.notna(seconds) else ""
+
+# resumen agregado por una clave (o global si by es None) con los KPIs derivados
+def summarize(groups, by=None):
+    t = groups.groupby(by, sort=True)[AGG_COLS].sum().reset_index() if by else groups[AGG_COLS].sum().to_frame().T
+    t["puntualidad_%"] = (100 * (t["con_salida_tope"] - t["retrasos"]) / t["con_salida_tope"].where(t["con_salida_tope"] > 0)).round(1)
+    t["estancia_media"] = (t["estancia_seg"] / t["con_estancia"].where(t["con_estancia"] > 0)).map(_fmt_stay)
+    return t.drop(columns=["con_salida_tope","con_estancia","estancia_seg"])
+
+def kpi_table(groups, extra=None):
+    tot = groups[AGG_COLS].sum(); total = int(tot["total"])
+    kpis = dict(extra or {})
+    kpis.update({"Total filas": total,
+        "% con LLEGADA REAL": (tot["con_llegada_real"]/total*100) if total else 0.0,
+        "% con SALIDA REAL": (tot["con_salida_real"]/total*100) if total else 0.0,
+        "Retrasos vs SALIDA TOPE (nº)": int(tot["retrasos"]),
+        "Puntualidad vs SALIDA TOPE (%)": (100*(tot["con_salida_tope"]-tot["retrasos"])/tot["con_salida_tope"]) if tot["con_salida_tope"] else "",
+        "Tiempo medio de estancia (hh:mm:ss)": _fmt_stay(tot["estancia_seg"]/tot["con_estancia"]) if tot["con_estancia"] else ""})
+    return pd.DataFrame([kpis]).T.rename(columns={0:"Valor"})
+
+# KPIs en vivo: aportación guardada por fila y sumas globales y por MUELLE/TRANSPORTISTA; una edición
+# resta la aportación vieja de las filas tocadas y suma la nueva (O(filas cambiadas), sin recorrer el día)
+class KpiCounters:
+    BY = ("MUELLE", "TRANSPORTISTA")
+    COLS = {"LLEGADA REAL", "SALIDA REAL", "SALIDA TOPE"} | set(BY)
+
+    def __init__(self, df):
+        self.index = df.index
+        self.rows = self._contrib(df)
+        self.keys = {by: _text(df[by]).astype(object) for by in self.BY}
+        self.total = self.rows.sum(axis=0)
+        self.groups = {by: {} for by in self.BY}
+        for by in self.BY: self._add(by, self.keys[by], self.rows, 1)
+
+    @staticmethod
+    def _contrib(df):
+        return row_contrib(df["LLEGADA REAL"], df["SALIDA REAL"], df["SALIDA TOPE"])
+
+    def _add(self, by, keys, rows, sign):
+        # suma (o resta) filas a sus grupos; un grupo sin filas desaparece del desglose
+        inv, uniq = pd.factorize(keys)
+        sums = np.zeros((len(uniq), len(AGG_COLS))); np.add.at(sums, inv, rows)
+        g = self.groups[by]
+        for k, v in zip(uniq, sums):
+            g[k] = g.get(k, 0) + sign * v
+            if g[k][0] <= 0: del g[k]
+
+    def update(self, df, labels, col):
+        # df: datos ya editados; labels: filas cambiadas. False si col no afecta a los KPIs
+        if col not in self.COLS: return False
+        labels = list(labels); pos = self.index.get_indexer(labels)
+        old = self.rows[pos]; new = self._contrib(df.loc[labels])
+        self.rows[pos] = new; self.total += (new - old).sum(axis=0)
+        for by in self.BY:
+            self._add(by, self.keys[by][pos], old, -1)
+            if col == by: self.keys[by][pos] = _text(df.loc[labels, by])
+            self._add(by, self.keys[by][pos], new, 1)
+        return True
+
+    def _frame(self, t):
+        t = t.copy(); t[AGG_COLS[:-1]] = t[AGG_COLS[:-1]].round().astype(int)
+        return t
+
+    def kpis(self):
+        return kpi_table(self._frame(pd.DataFrame([self.total], columns=AGG_COLS)))
+
+    def breakdown(self, by):
+        g = self.groups[by]
+        t = pd.DataFrame(list(g.values()), columns=AGG_COLS); t.insert(0, by, list(g.keys()))
+        return summarize(self._frame(t), by)
+
+REPORT_CHUNK_ROWS = 5000  # filas por bloque al volcar hojas grandes
+REPORT_FORMATS = {"xlsx": ".xlsx", "csv": ".csv", "parquet": ".parquet"}
+
+def _cells(df):
+    # valores nativos para openpyxl: NaN/NaT y textos vacíos -> celda omitida, categorías -> texto
+    obj = df.astype(object)
+    return obj.where(obj.notna() & (obj != ""), None).itertuples(index=False, name=None)
+
+# escribe [(hoja, DataFrame)] en streaming: xlsx con openpyxl en modo write_only (memoria constante,
+# por bloques) o, en la variante ligera, un CSV/Parquet por hoja junto a out_path. Cada archivo se escribe
+# en un temporal propio del proceso y se reemplaza de forma atómica: dos escritores nunca lo dejan a medias
+def write_report(out_path, sheets, fmt="xlsx", job=None):
+    total = sum(len(df) for _, df in sheets) or 1; done = 0
+    if fmt == "xlsx":
+        wb = Workbook(write_only=True)
+        for name, df in sheets:
+            ws = wb.create_sheet(name); ws.append([str(c) for c in df.columns])
+            for start in range(0, len(df), REPORT_CHUNK_ROWS):
+                chunk = df.iloc[start:start + REPORT_CHUNK_ROWS]
+                for row in _cells(chunk): ws.append(row)
+                done += len(chunk)
+                if job is not None: job.progress(0.95 * done / total)
+        tmp = f"{out_path}.{os.getpid()}.tmp"; wb.save(tmp); os.replace(tmp, out_path)
+        return out_path
+    base = os.path.splitext(out_path)[0]; paths = []
+    for name, df in sheets:
+        path = f"{base}_{fold_text(name).replace(' ', '_')}{REPORT_FORMATS[fmt]}"
+        tmp = f"{path}.{os.getpid()}.tmp"
+        if fmt == "csv": df.to_csv(tmp, index=False, encoding="utf-8-sig")
+        else: df.to_parquet(tmp, index=False)
+        os.replace(tmp, path); paths.append(path)
+        if job is not None: job.progress(len(paths) / len(sheets))
+    return paths[0]
+
+def report_sheets(groups, incidents, kpi_extra=None, data=None):
+    kpis = kpi_table(groups, kpi_extra).reset_index().rename(columns={"index": "KPI"})
+    sheets = [("KPIs", kpis)]
+    if data is not None: sheets.append(("Datos del día", data))
+    return sheets + [("Por transportista", summarize(groups, "TRANSPORTISTA")),
+                     ("Por muelle", summarize(groups, "MUELLE")), ("Incidencias", incidents)]
+
+def write_daily_report(job, view, lr, sr, st, out_path, fmt="xlsx"):
+    groups = aggregate_rows(view, lr, sr, st)
+    incidents = view.loc[view["INCIDENCIAS"].notna() & (view["INCIDENCIAS"].astype(str).str.strip() != ""), INCIDENT_COLS]
+    return write_report(out_path, report_sheets(groups, incidents, data=view), fmt, job)
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, op_date TEXT NOT NULL, closed_at TEXT NOT NULL, rows INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS ix_snapshots_date ON snapshots(op_date);
+CREATE TABLE IF NOT EXISTS snapshot_columns (snapshot_id INTEGER NOT NULL, name TEXT NOT NULL, dtype TEXT NOT NULL, version INTEGER NOT NULL,
+                                             categories TEXT, data BLOB NOT NULL, PRIMARY KEY (snapshot_id, name));
+CREATE TABLE IF NOT EXISTS snapshot_keys (snapshot_id INTEGER NOT NULL, op_date TEXT NOT NULL, transportista TEXT, muelle TEXT, rows INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS ix_keys_carrier ON snapshot_keys(transportista, op_date);
+CREATE INDEX IF NOT EXISTS ix_keys_dock ON snapshot_keys(muelle, op_date);
+"""
+
+HISTORY_FORMAT = 1  # PRAGMA user_version y versión de cada columna guardada
+
+# columna -> (dtype, versión, categorías JSON, bytes): buffers numpy planos, legibles con cualquier versión de pandas
+# (fechas como int64 de nanosegundos, NaT incluido; texto como códigos int32 + lista de categorías)
+def encode_column(s):
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return "datetime64[ns]", HISTORY_FORMAT, None, s.to_numpy(dtype="datetime64[ns]").view("<i8").tobytes()
+    cat = s.astype(object).where(s.notna(), "").astype(str).astype("category")
+    return "category", HISTORY_FORMAT, json.dumps([str(c) for c in cat.cat.categories], ensure_ascii=False), cat.cat.codes.to_numpy().astype("<i4").tobytes()
+
+def decode_column(dtype, version, categories, data):
+    if version != HISTORY_FORMAT: raise ValueError(f"versión de columna no soportada: {version}")
+    if dtype == "datetime64[ns]": return pd.Series(np.frombuffer(data, dtype="<i8").view("datetime64[ns]").copy())
+    if dtype == "category": return pd.Series(pd.Categorical.from_codes(np.frombuffer(data, dtype="<i4").astype(np.int32), categories=json.loads(categories)))
+    raise ValueError(f"tipo de columna no soportado: {dtype}")
+
+# histórico de cierres de día en SQLite, por columnas: cada cierre (snapshot) guarda una columna por BLOB,
+# las de fecha como datetime64 y el resto como categorías. snapshot_keys indexa fecha/transportista/muelle
+# para no abrir snapshots que no interesan; las consultas usan el último snapshot de cada fecha operativa
+class HistoryStore:
+    def __init__(self, path=HISTORY_DB, retention_days=HISTORY_RETENTION_DAYS):
+        self.path = path; self.retention_days = retention_days
+        self.agg_dir = os.path.join(os.path.dirname(path), "aggregates")
+        os.makedirs(self.agg_dir, exist_ok=True)
+        with closing(sqlite3.connect(self.path)) as con, con:
+            self._migrate(con); con.executescript(HISTORY_SCHEMA); con.execute(f"PRAGMA user_version = {HISTORY_FORMAT}")
+
+    def _migrate(self, con):
+        # las primeras versiones guardaban pickles de pandas (no portables entre versiones y ejecutables al leer):
+        # esa tabla se aparta sin leerla y sus cierres salen de las consultas
+        cols = [r[1] for r in con.execute("PRAGMA table_info(snapshot_columns)")]
+        if cols and "dtype" not in cols:
+            con.execute("ALTER TABLE snapshot_columns RENAME TO snapshot_columns_pickle")
+            con.execute("DELETE FROM snapshot_keys"); con.execute("DELETE FROM snapshots")
+            for path in glob.glob(os.path.join(self.agg_dir, "*.json")): os.remove(path)
+
+    def aggregate_path(self, sid):
+        return os.path.join(self.agg_dir, f"{sid}.json")
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path))
+
+    def append(self, df, op_date, closed_at=None):
+        op_date = pd.Timestamp(op_date).strftime("%Y-%m-%d")
+        closed_at = (closed_at or dt.datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        cols = {c: parse_dt_column(df[c], op_date) if c in DT_COLS else df[c] for c in REQUIRED_COLS}
+        keys = pd.DataFrame({"t": _text(cols["TRANSPORTISTA"]), "m": _text(cols["MUELLE"])}).value_counts().reset_index()
+        with self._connect() as con, con:
+            sid = con.execute("INSERT INTO snapshots (op_date, closed_at, rows) VALUES (?,?,?)", (op_date, closed_at, len(df))).lastrowid
+            con.executemany("INSERT INTO snapshot_columns VALUES (?,?,?,?,?,?)", ((sid, c) + encode_column(v) for c, v in cols.items()))
+            con.executemany("INSERT INTO snapshot_keys VALUES (?,?,?,?,?)",
+                            ((sid, op_date, t, m, int(n)) for t, m, n in keys.itertuples(index=False, name=None)))
+        self.prune()
+        return sid
+
+    def prune(self, today=None):
+        cutoff = (pd.Timestamp(today or dt.date.today()) - pd.Timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        with self._connect() as con, con:
+            old = "SELECT id FROM snapshots WHERE op_date < ?"
+            for (sid,) in con.execute(old, (cutoff,)).fetchall():
+                try: os.remove(self.aggregate_path(sid))
+                except FileNotFoundError: pass
+            con.execute(f"DELETE FROM snapshot_columns WHERE snapshot_id IN ({old})", (cutoff,))
+            con.execute(f"DELETE FROM snapshot_keys WHERE snapshot_id IN ({old})", (cutoff,))
+            con.execute("DELETE FROM snapshots WHERE op_date < ?", (cutoff,))
+
+    def snapshots(self, start, end, transportista=None, muelle=None):
+        # [(op_date, snapshot_id)] del último cierre de cada día del rango
+        start = pd.Timestamp(start).strftime("%Y-%m-%d"); end = pd.Timestamp(end).strftime("%Y-%m-%d")
+        sql = "SELECT op_date, MAX(id) FROM snapshots WHERE op_date BETWEEN ? AND ? GROUP BY op_date ORDER BY op_date"
+        with self._connect() as con:
+            latest = con.execute(sql, (start, end)).fetchall()
+            if transportista is None and muelle is None: return latest
+            sql = "SELECT DISTINCT snapshot_id FROM snapshot_keys WHERE op_date BETWEEN ? AND ?"; params = [start, end]
+            if transportista is not None: sql += " AND transportista = ?"; params.append(transportista)
+            if muelle is not None: sql += " AND muelle = ?"; params.append(muelle)
+            wanted = {r[0] for r in con.execute(sql, params)}
+        return [(d, sid) for d, sid in latest if sid in wanted]
+
+    def load_snapshot(self, sid, columns=None):
+        columns = columns or REQUIRED_COLS
+        with self._connect() as con:
+            rows = {r[0]: r[1:] for r in con.execute(f"SELECT name, dtype, version, categories, data FROM snapshot_columns WHERE snapshot_id = ? AND name IN ({','.join('?' * len(columns))})", [sid] + list(columns))}
+        return pd.DataFrame({c: decode_column(*rows[c]) for c in columns})
+
+    def query(self, start, end, transportista=None, muelle=None, columns=None):
+        columns = list(columns or REQUIRED_COLS)
+        need = columns + [c for c, v in (("TRANSPORTISTA", transportista), ("MUELLE", muelle)) if v is not None and c not in columns]
+        parts = []
+        for op_date, sid in self.snapshots(start, end, transportista, muelle):
+            part = self.load_snapshot(sid, need)
+            if transportista is not None: part = part[part["TRANSPORTISTA"] == transportista]
+            if muelle is not None: part = part[part["MUELLE"] == muelle]
+            part.insert(0, "FECHA OPERATIVA", pd.Timestamp(op_date)); parts.append(part)
+        if not parts: return pd.DataFrame(columns=["FECHA OPERATIVA"] + columns)
+        # concat une las categorías de cada día (quedan como texto si difieren)
+        return pd.concat(parts, ignore_index=True)[["FECHA OPERATIVA"] + columns]
+
+    def import_legacy_csv(self, folder=HISTORY_DIR):
+        # volcados CSV antiguos (AAAA-MM-DD_HHMMSS.csv) -> store; se renombran para no importarlos dos veces
+        for path in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                closed_at = dt.datetime.strptime(name, "%Y-%m-%d_%H%M%S")
+                df = pd.read_csv(path, dtype=str, keep_default_na=False)
+            except (ValueError, OSError, pd.errors.ParserError):
+                continue
+            for c in REQUIRED_COLS:
+                if c not in df.columns: df[c] = ""
+            self.append(df, closed_at.date(), closed_at); os.replace(path, path + ".imported")
+
+# agregado de un día del histórico -> JSON pequeño junto al store; función de módulo para el pool de procesos
+def build_day_aggregate(db_path, sid, op_date):
+    store = HistoryStore(db_path)
+    df = store.load_snapshot(sid, ["TRANSPORTISTA","MATRICULA","MUELLE","ESTADO","DESTINO","INCIDENCIAS","LLEGADA REAL","SALIDA REAL","SALIDA TOPE"])
+    groups = aggregate_rows(df, df["LLEGADA REAL"], df["SALIDA REAL"], df["SALIDA TOPE"])
+    inc = df.loc[df["INCIDENCIAS"].astype(str).str.strip() != "", INCIDENT_COLS].astype(str)
+    agg = {"op_date": op_date, "snapshot": sid, "groups": groups.values.tolist(), "incidents": inc.values.tolist()}
+    path = store.aggregate_path(sid); tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(agg, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+def range_report(store, start, end, out_path, workers=None, job=None):
+    days = store.snapshots(start, end)
+    if not days: return None
+    missing = [(sid, d) for d, sid in days if not os.path.exists(store.aggregate_path(sid))]
+    if len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(missing), workers or os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(build_day_aggregate, store.path, sid, d) for sid, d in missing]
+            for i, fut in enumerate(as_completed(futures), 1):
+                fut.result()
+                if job is not None:
+                    if job.cancelled: pool.shutdown(wait=False, cancel_futures=True)
+                    job.progress(0.9 * i / len(futures))
+    elif missing:
+        build_day_aggregate(store.path, *missing[0])
+    groups, incidents = [], []
+    for d, sid in days:
+        with open(store.aggregate_path(sid), "r", encoding="utf-8") as f: agg = json.load(f)
+        groups.append(pd.DataFrame(agg["groups"], columns=["TRANSPORTISTA","MUELLE"] + AGG_COLS))
+        incidents += [[d] + r for r in agg["incidents"]]
+    groups = pd.concat(groups, ignore_index=True)
+    incidents = pd.DataFrame(incidents, columns=["FECHA OPERATIVA"] + INCIDENT_COLS)
+    return write_report(out_path, report_sheets(groups, incidents, {"Desde": days[0][0], "Hasta": days[-1][0], "Días con cierre": len(days)}))
+
+# nombre del reporte de cada archivo (sin extensión): parte.xlsx -> parte_xlsx_report; si dos entradas de carpetas
+# distintas coinciden (transA/parte.xlsx y transB/parte.xlsx) se añade un hash corto de su carpeta
+def report_names(paths):
+    base = {p: os.path.basename(p).replace(".", "_") for p in paths}
+    seen = {}
+    for b in base.values(): seen[os.path.normcase(b)] = seen.get(os.path.normcase(b), 0) + 1
+    def folder_tag(p): return hashlib.sha1(os.path.normcase(os.path.dirname(os.path.abspath(p))).encode("utf-8")).hexdigest()[:6]
+    return {p: f"{b}_{folder_tag(p)}_report" if seen[os.path.normcase(b)] > 1 else f"{b}_report" for p, b in base.items()}
+
+# cargar -> mapear -> normalizar -> reporte, sin interfaz; función de módulo para el pool de procesos del modo por lotes
+def process_file(path, out_dir, sheet=None, fmt="xlsx", op_date=None, name=None):
+    plan = plan_import(path, sheet)
+    df = apply_mapping(read_import_table(path, plan["sheet"], plan["header"], plan["start"]), plan["mapping"], op_date)
+    lr, sr, st = (df[c] for c in ("LLEGADA REAL", "SALIDA REAL", "SALIDA TOPE"))
+    out_path = os.path.join(out_dir, (name or report_names([path])[path]) + REPORT_FORMATS[fmt])
+    return {"file": path, "rows": len(df), "mapped": sorted(plan["mapping"]), "report": write_daily_report(None, df, lr, sr, st, out_path, fmt)}
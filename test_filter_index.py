@@ -0,0 +1,60 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from logidesk_core import FilterIndex, normalize_frame, display_frame, fold_text, set_cells
+
+CARRIERS = ["Transportes Gómez", "LOGÍSTICA NORTE", "Rápidos Martín", "Frío Sur", ""]
+
+@pytest.fixture
+def df():
+    rnd = random.Random(7)
+    n = 500
+    text = pd.DataFrame({
+        "TRANSPORTISTA": [rnd.choice(CARRIERS) for _ in range(n)],
+        "MATRICULA": [f"{rnd.randint(0, 9999):04d}{rnd.choice('BCDF')}{rnd.choice('GHJK')}" for _ in range(n)],
+        "MUELLE": [f"M{rnd.randint(1, 12)}" for _ in range(n)],
+        "OBSERVACIONES": [rnd.choice(["", "Carga frágil", "REFRIGERADO", "sin observación", "Camión ÁMBAR"]) for _ in range(n)],
+        "LLEGADA REAL": [rnd.choice(["", f"2026-10-18 {rnd.randint(6, 22):02d}:{rnd.randint(0, 59):02d}:00"]) for _ in range(n)],
+    })
+    return normalize_frame(text)
+
+def expected(df, conditions):
+    # referencia: texto mostrado, plegado, con str.contains (AND de todas las condiciones)
+    shown = display_frame(df); hit = np.ones(len(df), dtype=bool)
+    for col, needle in conditions:
+        if needle.strip(): hit &= shown[col].map(fold_text).str.contains(fold_text(needle.strip()), regex=False).to_numpy()
+    return np.flatnonzero(hit)
+
+def positions(index, conditions):
+    pos = index.query(conditions)
+    return np.arange(len(index.index)) if pos is None else pos
+
+CASES = [
+    [("TRANSPORTISTA", "gomez")], [("TRANSPORTISTA", "LOGISTICA")], [("MUELLE", "M1")], [("MATRICULA", "12")],
+    [("OBSERVACIONES", "fragil")], [("OBSERVACIONES", "  ámbar ")], [("LLEGADA REAL", "2026-10-18 07")],
+    [("TRANSPORTISTA", "r"), ("MUELLE", "m1"), ("OBSERVACIONES", "o")], [("MATRICULA", "")], [],
+]
+
+@pytest.mark.parametrize("conditions", CASES)
+def test_query_matches_str_contains(df, conditions):
+    assert positions(FilterIndex(df), conditions).tolist() == expected(df, conditions).tolist()
+
+def test_incremental_typing(df):
+    # aguja que amplía la anterior (solo busca entre sus candidatos) y luego la acorta
+    index = FilterIndex(df)
+    for needle in ["1", "12", "123", "12", "9", ""]:
+        assert positions(index, [("MATRICULA", needle)]).tolist() == expected(df, [("MATRICULA", needle)]).tolist()
+
+def test_query_after_update(df):
+    index = FilterIndex(df)
+    index.query([("OBSERVACIONES", "carga")]); index.query([("TRANSPORTISTA", "frio")])
+    labels = list(df.index[::7])
+    set_cells(df, labels, "OBSERVACIONES", "Carga urgente"); index.update(labels, "OBSERVACIONES", "Carga urgente")
+    set_cells(df, labels[:10], "TRANSPORTISTA", "Frío Norte"); index.update(labels[:10], "TRANSPORTISTA", "Frío Norte")
+    moved = df.index[df["LLEGADA REAL"].notna()][:20]
+    df.loc[moved, "LLEGADA REAL"] = df.loc[moved, "LLEGADA REAL"] + pd.Timedelta(days=1)
+    index.update_values(moved, "LLEGADA REAL", df.loc[moved, "LLEGADA REAL"])
+    for conditions in [[("OBSERVACIONES", "carga")], [("OBSERVACIONES", "carga u")], [("TRANSPORTISTA", "frio")],
+                       [("TRANSPORTISTA", "norte"), ("OBSERVACIONES", "urgente")], [("LLEGADA REAL", "2026-10-19")]]:
+        assert positions(index, conditions).tolist() == expected(df, conditions).tolist()
@@ -0,0 +1,53 @@
+import random
+import pandas as pd
+import pytest
+from logidesk_core import KpiCounters, normalize_frame, set_cells, aggregate_rows, kpi_table, summarize
+
+@pytest.fixture
+def df():
+    rnd = random.Random(11)
+    n = 300
+    def when(h0, h1): return rnd.choice(["", f"2026-10-18 {rnd.randint(h0, h1):02d}:{rnd.randint(0, 59):02d}:00"])
+    text = pd.DataFrame({
+        "TRANSPORTISTA": [rnd.choice(["ACME", "BETA", "Frío Sur", ""]) for _ in range(n)],
+        "MUELLE": [rnd.choice(["M1", "M2", "M3"]) for _ in range(n)],
+        "LLEGADA REAL": [when(6, 11) for _ in range(n)],
+        "SALIDA REAL": [when(10, 16) for _ in range(n)],
+        "SALIDA TOPE": [when(11, 14) for _ in range(n)],
+        "OBSERVACIONES": [""] * n,
+    })
+    return normalize_frame(text)
+
+def edit(df, kpis, labels, col, value):
+    labels = list(labels); set_cells(df, labels, col, value)
+    return kpis.update(df, labels, col)
+
+def assert_matches(df, kpis):
+    groups = aggregate_rows(df, df["LLEGADA REAL"], df["SALIDA REAL"], df["SALIDA TOPE"])
+    pd.testing.assert_frame_equal(kpis.kpis(), kpi_table(groups))
+    for by in KpiCounters.BY:
+        live = kpis.breakdown(by).sort_values(by).reset_index(drop=True)
+        pd.testing.assert_frame_equal(live, summarize(groups, by).reset_index(drop=True), check_dtype=False)
+
+def test_initial_counters(df):
+    assert_matches(df, KpiCounters(df))
+
+def test_counters_after_edits(df):
+    kpis = KpiCounters(df)
+    assert edit(df, kpis, df.index[:40], "LLEGADA REAL", pd.Timestamp("2026-10-18 09:15"))
+    assert edit(df, kpis, df.index[20:60], "SALIDA REAL", pd.Timestamp("2026-10-18 15:45"))
+    assert edit(df, kpis, df.index[::9], "SALIDA REAL", pd.NaT)
+    assert edit(df, kpis, df.index[5:25], "SALIDA TOPE", pd.Timestamp("2026-10-18 12:00"))
+    assert edit(df, kpis, df.index[::4], "MUELLE", "M7")  # categoría nueva
+    assert edit(df, kpis, df.index[df["TRANSPORTISTA"] == "BETA"], "TRANSPORTISTA", "ACME")  # BETA desaparece
+    assert not edit(df, kpis, df.index[:3], "OBSERVACIONES", "nota")
+    assert_matches(df, kpis)
+    assert "BETA" not in kpis.groups["TRANSPORTISTA"]
+
+def test_counters_after_reanchoring_rows(df):
+    # filas movidas de día con valores distintos por fila (cambio de fecha operativa)
+    kpis = KpiCounters(df)
+    labels = df.index[df["SALIDA TOPE"].notna()][:50]
+    df.loc[labels, "SALIDA TOPE"] = df.loc[labels, "SALIDA TOPE"] + pd.Timedelta(days=1)
+    assert kpis.update(df, labels, "SALIDA TOPE")
+    assert_matches(df, kpis)
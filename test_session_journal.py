@@ -0,0 +1,68 @@
+import os, datetime as dt
+import pandas as pd
+import pytest
+import logidesk_core as core
+from logidesk_core import SessionJournal
+
+def day():
+    return pd.DataFrame({"TRANSPORTISTA": ["ACME", "BETA", "ACME"], "MUELLE": ["M1", "M2", "M3"]})
+
+def journal(tmp_path):
+    return SessionJournal(str(tmp_path / "session.csv"), str(tmp_path / "session.journal"))
+
+def test_restore_stops_at_torn_last_line(tmp_path):
+    j = journal(tmp_path); j.compact(day())
+    j.append([0], "MUELLE", "M9"); j.append([1, 2], "TRANSPORTISTA", "GAMMA"); j.close()
+    # corte a mitad de la tercera línea
+    with open(j.journal, "a", encoding="utf-8") as f: f.write('{"rows": [0], "col": "MUELLE", "va')
+    df = journal(tmp_path).restore()
+    assert df["MUELLE"].tolist() == ["M9", "M2", "M3"]
+    assert df["TRANSPORTISTA"].tolist() == ["ACME", "GAMMA", "GAMMA"]
+
+def test_rotate_after_failed_compaction_drops_torn_tail(tmp_path):
+    j = journal(tmp_path); j.compact(day())
+    j.append([0], "MUELLE", "M9"); j.close()
+    with open(j.journal, "a", encoding="utf-8") as f: f.write('{"rows": [1], "co')
+    j.rotate()  # el snapshot de esta rotación no llega a escribirse
+    j.append([2], "MUELLE", "M7"); j.rotate(); j.close()
+    assert not os.path.exists(j.journal)
+    assert journal(tmp_path).restore()["MUELLE"].tolist() == ["M9", "M2", "M7"]
+
+def test_crash_between_replace_and_journal_removal(tmp_path, monkeypatch):
+    j = journal(tmp_path); j.compact(day())
+    j.append([0], "MUELLE", "M9"); j.append([1], "MUELLE", "M8")
+    df = day(); df.loc[0, "MUELLE"] = "M9"; df.loc[1, "MUELLE"] = "M8"
+    seq, n = j.rotate()
+    assert n == 2
+    j.append([1], "MUELLE", "M5"); j.close()  # edición posterior a la copia, en el diario nuevo
+    def crash(path): raise OSError("corte de luz")
+    monkeypatch.setattr(core.os, "remove", crash)
+    with pytest.raises(OSError): j.write_snapshot(df, seq)
+    monkeypatch.undo()
+    # snapshot nuevo + JOURNAL.1 ya incluido en él + diario nuevo: reaplicar .1 no cambia nada
+    assert os.path.exists(j.rotated)
+    restored = journal(tmp_path).restore()
+    assert restored["MUELLE"].tolist() == ["M9", "M5", "M3"]
+    assert restored.index.tolist() == [0, 1, 2]
+
+def test_op_date_survives_restore(tmp_path):
+    # horas sueltas guardadas como HH:MM:SS: al restaurar se anclan a la fecha guardada, no a la de hoy
+    text = pd.DataFrame({"MUELLE": ["M1", "M2"], "SALIDA TOPE": ["14:00", "2026-10-17 09:00:00"]})
+    df, anchors = core.normalize_anchored(text, dt.date(2026, 10, 17))
+    j = journal(tmp_path); j.compact(core.session_frame(df.copy(), anchors.rows()), anchors.day.date())
+    r = journal(tmp_path); restored, anchors = core.normalize_anchored(r.restore(), r.op_date)
+    assert r.op_date == dt.date(2026, 10, 17)
+    assert restored["SALIDA TOPE"].tolist() == [pd.Timestamp("2026-10-17 14:00"), pd.Timestamp("2026-10-17 09:00")]
+    assert anchors.rows()["SALIDA TOPE"].tolist() == [0]
+
+def test_op_date_change_is_journaled(tmp_path):
+    j = journal(tmp_path); j.compact(day(), dt.date(2026, 10, 17))
+    j.append_op_date(dt.date(2026, 10, 19)); j.append([0], "MUELLE", "M9"); j.close()
+    r = journal(tmp_path); df = r.restore()
+    assert r.op_date == dt.date(2026, 10, 19) and df["MUELLE"].tolist() == ["M9", "M2", "M3"]
+
+def test_snapshot_without_op_date(tmp_path):
+    # snapshots anteriores: sin línea de cabecera
+    j = journal(tmp_path); j.compact(day())
+    r = journal(tmp_path)
+    assert r.restore()["TRANSPORTISTA"].tolist() == ["ACME", "BETA", "ACME"] and r.op_date is None
@@ -0,0 +1,34 @@
+import datetime as dt
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from logidesk_core import read_xlsx_head, read_sample, read_import_table, list_sheets, sniff_header_row, header_names
+
+@pytest.fixture
+def book(tmp_path):
+    wb = Workbook(); ws = wb.active; ws.title = "Resumen"; ws["C4"] = "solo C4"
+    ws = wb.create_sheet("Día 2")
+    ws.append(["Parte diario de muelles"]); ws.append([])
+    ws.append([" TRANSPORTISTA ", "MAT.", None, "Hora llegada", dt.datetime(2026, 10, 18), dt.time(8, 30), 7, "Notas"])
+    for i in range(60):
+        ws.append([f"Transportes {i % 3}", f"{i:04d}BCD", 2.5, dt.datetime(2026, 10, 18, 6 + i % 12, i % 60), None, None, i % 2 == 0, "frío" if i % 5 else ""])
+    ws["A10"] = "=A9&\"x\""
+    path = tmp_path / "parte.xlsx"; wb.save(path)
+    return str(path)
+
+def test_sheet_names(book):
+    assert list_sheets(book) == pd.ExcelFile(book).sheet_names
+
+@pytest.mark.parametrize("sheet", ["Día 2", 1, "Resumen", 0])
+def test_head_matches_read_excel(book, sheet):
+    ours = read_xlsx_head(book, sheet, 30); ref = pd.read_excel(book, sheet_name=sheet, header=None, nrows=30)
+    assert ours.shape == ref.shape
+    pd.testing.assert_frame_equal(ours.astype(object).where(ours.notna(), None), ref.astype(object).where(ref.notna(), None),
+                                  check_dtype=False, check_column_type=False)
+    header = sniff_header_row(ours)
+    assert header == sniff_header_row(ref)
+    # los nombres de la previsualización son los de las columnas que dará la importación completa
+    assert header_names(ours, header) == list(read_import_table(book, sheet, header, header + 1).columns)
+
+def test_read_sample_stops_at_nrows(book):
+    assert len(read_sample(book, "Día 2", 5)) == 5